@@ -0,0 +1,35 @@
+import time
+
+import hydra
+from omegaconf import DictConfig
+
+from monte_carlo_graph_search.environment.minigrid.custom_minigrid_env import (
+    CustomMinigridEnv,
+)
+from monte_carlo_graph_search.environment.minigrid.tabular_minigrid_env import (
+    build_transition_table,
+)
+
+# Builds the transition table of a minigrid level, e.g.
+# python build_transition_table.py env.level_name=test16 env.transition_table=../transition_tables/test16.npz
+
+
+@hydra.main(version_base=None, config_path="configs", config_name="mcgs")
+def run_app(config: DictConfig) -> None:
+
+    if config.env.transition_table is None:
+        raise ValueError("env.transition_table has to be set to the path of the table")
+
+    env = CustomMinigridEnv(env_config=config.env)
+
+    start_time = time.perf_counter()
+    table = build_transition_table(env)
+    end_time = time.perf_counter()
+
+    path = hydra.utils.to_absolute_path(config.env.transition_table)
+    table.save(path)
+    print(f"Saved {len(table)} states of level {config.env.level_name} to {path} in {end_time - start_time:.1f}s")
+
+
+if __name__ == "__main__":
+    run_app()
@@ -0,0 +1,85 @@
+import os
+import tempfile
+
+from omegaconf import OmegaConf
+
+from monte_carlo_graph_search.agents.mcgs_agent import MCGSAgent
+from monte_carlo_graph_search.core.array_graph import ArrayGraph
+from monte_carlo_graph_search.core.graph import Graph
+from monte_carlo_graph_search.core.logger import MemoryLogger
+from monte_carlo_graph_search.core.node import Node
+from monte_carlo_graph_search.environment.minigrid.custom_minigrid_env import (
+    CustomMinigridEnv,
+)
+from monte_carlo_graph_search.environment.minigrid.minigrid_novelty import (
+    MinigridNovelty,
+)
+
+# Round trip of save_graph and load_graph: a graph searched with each backend is saved and loaded into both
+# backends, which must give back the same nodes, edges, observation ids, frontier and terminated nodes.
+
+BACKENDS = {"networkx": Graph, "array": ArrayGraph}
+NUMBER_OF_MOVES = 4
+NODE_FIELDS = ["parent", "action", "is_leaf", "terminated", "visits", "total_value", "novelty_value", "unreachable"]
+
+
+def search_graph(config):
+    env = CustomMinigridEnv(env_config=config.env)
+    agent = MCGSAgent(env=env, novelty=MinigridNovelty(config=config.novelty), logger=MemoryLogger(), config=config)
+    for _ in range(NUMBER_OF_MOVES):
+        agent.act(agent.plan())
+    agent.close()
+    return agent.graph
+
+
+def check_same_graph(saved, loaded):
+
+    assert loaded.get_number_of_nodes() == saved.get_number_of_nodes()
+    assert loaded.get_number_of_edges() == saved.get_number_of_edges()
+    assert loaded.terminated_node_ids == saved.terminated_node_ids
+    assert {node.id for node in loaded.get_all_nodes_info() if loaded.in_frontier(node)} == {
+        node.id for node in saved.get_all_nodes_info() if saved.in_frontier(node)
+    }
+
+    for node in saved.get_all_nodes_info():
+        assert loaded.has_node(node.observation)
+        assert loaded.get_node_id(node.observation) == node.id
+        other = loaded.get_node_by_observation(node.observation)
+        for name in NODE_FIELDS:
+            value, other_value = getattr(node, name), getattr(other, name)
+            if name == "parent":
+                value, other_value = [None if x is None else x.id for x in (value, other_value)]
+            assert value == other_value, f"Node {node.id}, {name}: {other_value} != {value}"
+
+        assert loaded.get_successor_ids(node.id) == saved.get_successor_ids(node.id)
+        for child_id in saved.get_successor_ids(node.id):
+            edge = saved.get_edge_info_by_ids(node.id, child_id)
+            other = loaded.get_edge_info_by_ids(node.id, child_id)
+            assert (other.action, other.reward, other.terminated) == (edge.action, edge.reward, edge.terminated)
+
+
+if __name__ == "__main__":
+
+    config = OmegaConf.load(os.path.join(os.path.dirname(__file__), "configs", "mcgs.yaml"))
+    config.search.budget_per_move = 200
+
+    with tempfile.TemporaryDirectory() as directory:
+        for saved_backend in BACKENDS:
+            config.graph.backend = saved_backend
+            saved = search_graph(config)
+            path = os.path.join(directory, saved_backend)
+            saved.save_graph(path)
+
+            for loaded_backend, graph_class in BACKENDS.items():
+                loaded = graph_class(seed=0, config=config)
+                loaded.load_graph(path + ".gpickle")
+                check_same_graph(saved, loaded)
+
+                # The loaded graph keeps growing from the saved ids and paths are rebuilt from the root
+                root_node = loaded.get_node_info(saved.root_node.id)
+                loaded.set_root_node(root_node)
+                assert loaded.get_best_node(only_reachable=True).id == saved.get_best_node(only_reachable=True).id
+                node = Node(("new node",), root_node, True, 0, 0, False, False, 0, 0, config)
+                assert loaded.add_node(node) and node.id == saved.get_number_of_nodes()
+
+                print(f"{saved_backend} graph loaded into {loaded_backend}: {saved.get_number_of_nodes()} nodes, same")
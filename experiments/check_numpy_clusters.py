@@ -0,0 +1,63 @@
+import numpy as np
+
+from monte_carlo_graph_search.environment.griddly.clusters import ClustersEnv
+from monte_carlo_graph_search.environment.griddly.numpy_clusters_env import (
+    NumpyClustersEnv,
+)
+
+# Differential test of NumpyClustersEnv against the Griddly ClustersEnv, on a winning episode and on episodes of
+# random actions. Every step of the NumPy environment, of a copy of it and of a batch of it must give the same
+# observation, reward, terminated and truncated as the Griddly one.
+
+NUMBER_OF_EPISODES = 200
+BATCH_SIZE = 8
+
+# Random actions almost never win, this sequence (found by a breadth-first search) clusters all the boxes
+WINNING_ACTIONS = [3, 4, 1, 2, 2, 1, 1, 1, 4, 4, 2, 3, 4, 3, 2, 3, 3, 4, 4, 2, 1, 4, 1, 4, 1, 3, 4, 1]
+
+if __name__ == "__main__":
+
+    random = np.random.RandomState(0)
+    episodes = [WINNING_ACTIONS] + [None] * NUMBER_OF_EPISODES
+    griddly_env = ClustersEnv(config=None)
+    numpy_env = NumpyClustersEnv(config=None)
+    assert griddly_env.get_observation() == numpy_env.get_observation()
+
+    steps = 0
+    outcomes = {"won": 0, "lost": 0, "truncated": 0}
+    for episode, episode_actions in enumerate(episodes):
+        griddly_env.reset()
+        numpy_env.reset()
+        batch = numpy_env.make_batch(BATCH_SIZE)
+        batch.load_all([numpy_env] * BATCH_SIZE)
+
+        done = False
+        while not done:
+            if episode_actions is None:
+                action = random.randint(griddly_env.action_space.n)
+            else:
+                action = episode_actions[griddly_env.current_step]
+            griddly_step = griddly_env.step(action)
+            copy_env = numpy_env.copy()
+            numpy_step = numpy_env.step(action)
+            copy_step = copy_env.step(action)
+            rewards, terminated, truncated = batch.step(np.full(BATCH_SIZE, action))
+
+            expected = (griddly_step[0], griddly_step[1], griddly_step[2], griddly_step[3])
+            for result in [numpy_step[:4], copy_step[:4]]:
+                assert result == expected, f"Episode {episode}, step {steps}: {result} != {expected}"
+            for index in range(BATCH_SIZE):
+                result = (batch.get_observation(index), rewards[index], terminated[index], truncated[index])
+                assert result == expected, f"Episode {episode}, step {steps}, row {index}: {result} != {expected}"
+
+            steps += 1
+            done = griddly_step[2] or griddly_step[3]
+            if done:
+                if griddly_step[2]:
+                    outcomes["lost"] += 1
+                elif numpy_env.box_count == 0:
+                    outcomes["won"] += 1
+                else:
+                    outcomes["truncated"] += 1
+
+    print(f"{len(episodes)} episodes, {steps} steps, same as Griddly. Outcomes: {outcomes}")
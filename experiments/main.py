@@ -1,18 +1,24 @@
 import hydra
 from omegaconf import DictConfig
 
+from monte_carlo_graph_search.agents.ensemble_agent import EnsembleAgent
 from monte_carlo_graph_search.agents.mcgs_agent import MCGSAgent
 from monte_carlo_graph_search.core.logger import NeptuneLogger
-from monte_carlo_graph_search.environment.griddly.clusters import ClustersEnv
 from monte_carlo_graph_search.environment.griddly.clusters_novelty import (
     ClustersNovelty,
 )
+from monte_carlo_graph_search.environment.griddly.numpy_clusters_env import (
+    NumpyClustersEnv,
+)
 from monte_carlo_graph_search.environment.minigrid.custom_minigrid_env import (
     CustomMinigridEnv,
 )
 from monte_carlo_graph_search.environment.minigrid.minigrid_novelty import (
     MinigridNovelty,
 )
+from monte_carlo_graph_search.environment.minigrid.tabular_minigrid_env import (
+    TabularMinigridEnv,
+)
 from monte_carlo_graph_search.utils import utils
 from monte_carlo_graph_search.utils.plotting import plot_images
 
@@ -26,12 +32,21 @@ from monte_carlo_graph_search.utils.plotting import plot_images
 def init_env(config):
 
     config_type = config.env.type
-    if config_type == "minigrid":
+    if config_type == "minigrid" and config.env.transition_table is not None:
+        env = TabularMinigridEnv(env_config=config.env)
+        novelty = MinigridNovelty(config=config.novelty)
+    elif config_type == "minigrid":
         env = CustomMinigridEnv(env_config=config.env)
         novelty = MinigridNovelty(config=config.novelty)
     elif config_type == "clusters":
+        # Imported here, Griddly needs Vulkan, which the NumPy backend and minigrid don't
+        from monte_carlo_graph_search.environment.griddly.clusters import ClustersEnv
+
         env = ClustersEnv(config=config.env)
         novelty = ClustersNovelty(config=config.novelty)
+    elif config_type == "clusters_numpy":
+        env = NumpyClustersEnv(config=config.env)
+        novelty = ClustersNovelty(config=config.novelty)
     else:
         raise ValueError(f"Unknown environment type: {config_type}")
     return env, novelty
@@ -42,9 +57,15 @@ def run_app(config: DictConfig) -> None:
 
     logger = NeptuneLogger(config=config, name="MCGS")
 
+    if config.env.transition_table is not None:  # Hydra runs in its own output directory
+        config.env.transition_table = hydra.utils.to_absolute_path(config.env.transition_table)
+
     env, novelty = init_env(config)
 
-    agent = MCGSAgent(env=env, novelty=novelty, logger=logger, config=config)
+    if config.ensemble.num_agents > 1:
+        agent = EnsembleAgent(env=env, init_env=init_env, logger=logger, config=config)
+    else:
+        agent = MCGSAgent(env=env, novelty=novelty, logger=logger, config=config)
 
     image = env.render()
     images = [image]
@@ -73,6 +94,7 @@ def run_app(config: DictConfig) -> None:
 
     utils.add_to_experiment_file(f"../experiment_runs/{config.run_name}.txt", logger.get_id())
     logger.close()
+    agent.close()
 
 
 if __name__ == "__main__":
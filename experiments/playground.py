@@ -9,11 +9,11 @@ if __name__ == "__main__":
     env.env.unwrapped.level = 0
     for _ in range(1000):
         start_time = time.perf_counter()
-        env2 = env.clone()
+        env2 = env.copy()
         end_time = time.perf_counter()
         times.append(end_time - start_time)
 
-    print(times)
+    print(f"Mean copy time: {sum(times) / len(times) * 1000:.3f}ms")
     # env.reset()
 
     # actions = [3, 4, 1, 2, 2, 3, 4, 4, 1, 4, 4, 1, 1, 3, 2, 2, 2, 1, 1, 4, 4, 2, 1, 4, 4, 3, 3, 3, 2, 3, 4]
@@ -0,0 +1,147 @@
+import copy
+import multiprocessing
+import time
+
+import numpy as np
+
+from monte_carlo_graph_search.agents.mcgs_agent import MCGSAgent
+from monte_carlo_graph_search.core.logger import MemoryLogger
+from monte_carlo_graph_search.utils import utils
+
+
+def run_worker(connection, init_env, config):
+
+    # Every worker grows its own graph for the whole game, and only follows the moves chosen by the ensemble
+    env, novelty = init_env(config)
+    agent = MCGSAgent(env=env, novelty=novelty, logger=MemoryLogger(), config=config)
+
+    while True:
+        message = connection.recv()
+        if message[0] == "plan":
+            action = agent.plan()
+            connection.send((agent.get_root_child_statistics(action), agent.logger.pop_metrics()))
+        elif message[0] == "act":
+            _, action, action_failure_prob = message
+            agent.env.stochastic_step(action, action_failure_prob)
+        elif message[0] == "final_metrics":
+            _, done, total_reward = message
+            connection.send(agent.get_final_metrics(done, total_reward))
+        elif message[0] == "close":
+            agent.close()
+            connection.close()
+            return
+
+
+class EnsembleAgent:
+    """
+    Root-parallel search: K MCGS agents with different seeds plan the same move in separate processes,
+    sharing nothing during the search. The statistics of the children of their roots are merged to choose the move,
+    and every agent then plays the chosen move in its own copy of the environment.
+    """
+
+    def __init__(self, env, init_env, logger, config):
+
+        self.config = config
+        self.random = np.random.RandomState(self.config.search.seed)
+
+        self.env = env
+        self.logger = logger
+        self.move_counter = 0
+
+        context = multiprocessing.get_context("fork")  # init_env doesn't need to be importable by the workers
+        self.connections = []
+        self.workers = []
+        for idx in range(self.config.ensemble.num_agents):
+            worker_config = copy.deepcopy(config)
+            worker_config.search.seed = config.search.seed + idx
+            connection, worker_connection = context.Pipe()
+            worker = context.Process(target=run_worker, args=(worker_connection, init_env, worker_config))
+            worker.start()
+            self.connections.append(connection)
+            self.workers.append(worker)
+
+    def plan(self) -> int:
+
+        start_time = time.perf_counter()
+        self.move_counter += 1
+
+        for connection in self.connections:
+            connection.send(("plan",))
+        results = [connection.recv() for connection in self.connections]
+
+        aggregated_metrics = {}
+        for _, worker_metrics in results:
+            for _, metrics in worker_metrics:
+                utils.update_metrics(aggregated_metrics, metrics)
+        aggregated_metrics = utils.dict_mean(aggregated_metrics)
+
+        statistics = self.merge_statistics([worker_statistics for worker_statistics, _ in results])
+        action = self.select_action(statistics)
+
+        end_time = time.perf_counter()
+        aggregated_metrics.update(
+            moves=self.move_counter,
+            action=action,
+            ensemble_time_per_move=end_time - start_time,
+        )
+        self.logger.write(aggregated_metrics, self.move_counter)
+
+        return action
+
+    def act(self, action):
+        action_failure_prob = self.random.random_sample()
+        for connection in self.connections:
+            connection.send(("act", action, action_failure_prob))
+        return self.env.stochastic_step(action, action_failure_prob)
+
+    def merge_statistics(self, worker_statistics):
+
+        merged = {}
+        for statistics in worker_statistics:
+            for action, child in statistics.items():
+                merged_child = merged.setdefault(
+                    action,
+                    {"visits": 0, "total_value": 0, "max_value": -np.inf, "done_distance": None, "best_value": None},
+                )
+                merged_child["visits"] += child["visits"]
+                merged_child["total_value"] += child["total_value"]
+                merged_child["max_value"] = max(merged_child["max_value"], child["max_value"])
+                distance = child["done_distance"]
+                if distance is not None and (
+                    merged_child["done_distance"] is None or distance < merged_child["done_distance"]
+                ):
+                    merged_child["done_distance"] = distance
+                value = child["best_value"]
+                if value is not None and (merged_child["best_value"] is None or value > merged_child["best_value"]):
+                    merged_child["best_value"] = value
+        return merged
+
+    def select_action(self, statistics):
+
+        # Same order as MCGSAgent.select_best_move: the closest done node, then the best node, ties go to more visits
+        if len(statistics) == 0:
+            return 6  # No action
+
+        done = {action: child for action, child in statistics.items() if child["done_distance"] is not None}
+        if len(done) > 0:
+            return min(done, key=lambda action: (done[action]["done_distance"], -done[action]["visits"], action))
+
+        best = {action: child for action, child in statistics.items() if child["best_value"] is not None}
+        if len(best) > 0:
+            return max(best, key=lambda action: (best[action]["best_value"], best[action]["visits"], -action))
+
+        return max(statistics, key=lambda action: (statistics[action]["visits"], -action))
+
+    def get_final_metrics(self, done, total_reward):
+
+        # Novelty and subgoal metrics are the ones of the first agent of the ensemble
+        self.connections[0].send(("final_metrics", done, total_reward))
+        metrics = self.connections[0].recv()
+        metrics["total_moves"] = self.move_counter
+        return metrics
+
+    def close(self):
+        for connection in self.connections:
+            connection.send(("close",))
+        for worker in self.workers:
+            worker.join()
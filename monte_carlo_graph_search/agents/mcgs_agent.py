@@ -1,13 +1,30 @@
+import threading
 import time
 
 import numpy as np
 
+from monte_carlo_graph_search.core.array_graph import ArrayGraph
 from monte_carlo_graph_search.core.edge import Edge
 from monte_carlo_graph_search.core.graph import Graph
 from monte_carlo_graph_search.core.node import Node
+from monte_carlo_graph_search.core.rollout_executor import RolloutExecutor
+from monte_carlo_graph_search.core.snapshot_store import SnapshotStore
+from monte_carlo_graph_search.core.transition_cache import TransitionCache
 from monte_carlo_graph_search.utils import utils
 
 
+def init_graph(seed, config):
+
+    backend = config.graph.backend
+    if backend == "networkx":
+        graph = Graph(seed=seed, config=config)
+    elif backend == "array":
+        graph = ArrayGraph(seed=seed, config=config)
+    else:
+        raise ValueError(f"Unknown graph backend: {backend}")
+    return graph
+
+
 class MCGSAgent:
     def __init__(self, env, novelty, logger, config):
 
@@ -16,9 +33,28 @@ class MCGSAgent:
 
         self.env = env
         self.logger = logger
-        self.graph = Graph(seed=self.config.search.seed, config=config)
+        self.graph = init_graph(seed=self.config.search.seed, config=config)
         self.novelty = novelty
 
+        # Snapshots and cached transitions are only exact in deterministic environments
+        self.snapshots = None
+        if self.config.snapshots.use_snapshots and not self.env.is_stochastic:
+            self.snapshots = SnapshotStore(self.config.snapshots.max_snapshots)
+        self.transitions = None
+        if self.config.search.use_transition_cache and not self.env.is_stochastic:
+            self.transitions = TransitionCache()
+
+        self.batch_env = None  # Reused between iterations by the batched simulation
+        self.graph_lock = threading.RLock()  # Only used by the threaded search
+        self.search_condition = threading.Condition(self.graph_lock)  # Notified when rollouts are backpropagated
+        self.search_errors = []
+        self.rollout_executor = None
+        if self.config.search.num_search_threads > 1 and self.config.search.num_simulation_workers == 0:
+            # Rollouts in the search threads would run one at a time under the GIL, only the workers run in parallel
+            raise ValueError("search.num_search_threads > 1 needs search.num_simulation_workers > 0")
+        if self.config.search.num_simulation_workers > 0:
+            self.rollout_executor = RolloutExecutor(self.env, self.config.search.num_simulation_workers)
+
         # statistic counters, maybe move into another class
         self.edge_counter = 0
         self.move_counter = 0
@@ -40,6 +76,7 @@ class MCGSAgent:
         self.root_node.chosen = True
 
         self.graph.add_node(self.root_node)
+        self.root_node = self.graph.get_node_info(self.root_node.id)
         self.novelty.update_posterior(
             self.root_node.observation,
             self.root_node.terminated,
@@ -61,10 +98,13 @@ class MCGSAgent:
 
         remaining_budget = self.config.search.budget_per_move
         iterations = 0
+        if self.config.search.num_search_threads > 1:  # The threads spend the whole budget of the move
+            iterations = self.threaded_search(aggregated_metrics)
+            remaining_budget = 0
+
         while remaining_budget > 0:
             # Selection
-            selection_env = self.env.copy()
-            node, selection_budget, selection_metrics = self.selection(selection_env)
+            node, selection_env, selection_budget, selection_metrics = self.selection()
             utils.update_metrics(aggregated_metrics, selection_metrics)
 
             # Expansion - This could be modified to allow single child expansion
@@ -76,33 +116,29 @@ class MCGSAgent:
 
             # Rollouts
             total_simulation_budget = 0
+            simulations = None
+            if self.rollout_executor is not None and len(children) > 0:
+                simulations, joint_simulation_metrics = self.parallel_simulation(actions_to_children, selection_env)
+                utils.update_metrics(aggregated_metrics, joint_simulation_metrics)
+            elif self.config.search.use_batch_simulation and len(children) > 0:
+                simulations, joint_simulation_metrics = self.batch_simulation(actions_to_children, selection_env)
+                utils.update_metrics(aggregated_metrics, joint_simulation_metrics)
+
             for idx in range(len(children)):
-                child_average_reward, trajectories, single_simulation_budget, simulation_metrics = self.simulation(
-                    actions_to_children[idx], selection_env
-                )
+                if simulations is not None:
+                    child_average_reward, trajectories, single_simulation_budget = simulations[idx]
+                else:
+                    child_average_reward, trajectories, single_simulation_budget, simulation_metrics = self.simulation(
+                        actions_to_children[idx], selection_env
+                    )
+                    utils.update_metrics(aggregated_metrics, simulation_metrics)
                 total_simulation_budget += single_simulation_budget
-                utils.update_metrics(aggregated_metrics, simulation_metrics)
 
-                for trajectory in trajectories:
-                    first_node = self.graph.get_node_info(trajectory[0][0])
-                    if first_node.unreachable and first_node != self.root_node:
-                        raise AssertionError("Before storrout Rollout First node is unreachable", first_node.chosen)
-                # Storing rollouts
-                if self.config.stored_rollouts.use_stored_rollouts:
-                    storing_nodes_metrics = self.add_stored_nodes(trajectories)
-                    utils.update_metrics(aggregated_metrics, storing_nodes_metrics)
-
-                # Backpropagation
-                if self.config.use_backpropagation:
-                    start_backprop_time = time.perf_counter()
-                    if self.config.stored_rollouts.use_stored_rollouts:
-                        for trajectory in trajectories:
-                            self.backpropagation(trajectory)
-                    end_backprop_time = time.perf_counter()
-                    backprop_metrics = {"backpropagation_time": (end_backprop_time - start_backprop_time)}
-                    utils.update_metrics(aggregated_metrics, backprop_metrics)
+                self.store_and_backpropagate(trajectories, aggregated_metrics)
 
             iteration_budget = selection_budget + expansion_budget + total_simulation_budget
+            if self.transitions is not None:  # Cached iterations might not spend any budget
+                iteration_budget = max(iteration_budget, 1)
             remaining_budget -= iteration_budget
 
             iteration_metrics = {"iteration_spent_budget": iteration_budget}
@@ -123,6 +159,8 @@ class MCGSAgent:
         aggregated_metrics.update({f"{key}": int(value) for key, value in subgoals.items()})
 
         aggregated_metrics.update(self.graph.get_metrics())
+        if self.transitions is not None:
+            aggregated_metrics.update(self.transitions.get_metrics())
         aggregated_metrics.update(
             moves=self.move_counter,
             action=action,
@@ -139,14 +177,97 @@ class MCGSAgent:
 
         return action
 
+    def threaded_search(self, aggregated_metrics):
+
+        # Every search thread runs whole iterations against the shared graph. Everything that reads or changes the
+        # graph runs under the graph lock, while the rollouts of different threads run at the same time in the workers.
+        self.remaining_budget = self.config.search.budget_per_move
+        self.iterations = 0
+        self.in_flight_nodes = 0
+        threads = [
+            threading.Thread(target=self.search_thread, args=(aggregated_metrics,))
+            for _ in range(self.config.search.num_search_threads)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        if self.search_errors:
+            raise self.search_errors[0]
+        return self.iterations
+
+    def search_thread(self, aggregated_metrics):
+
+        try:
+            while True:
+                with self.graph_lock:
+                    # If every node of the frontier is in flight, the selection would fall back to the root and
+                    # simulate its children again, so the thread waits for the rollouts of the other threads
+                    while self.in_flight_nodes > 0 and self.graph.count_selectable_frontier_nodes() == 0:
+                        if self.remaining_budget <= 0 or self.search_errors:
+                            break
+                        self.search_condition.wait()
+                    if self.remaining_budget <= 0 or self.search_errors:
+                        return
+
+                    node, selection_env, selection_budget, selection_metrics = self.selection()
+                    utils.update_metrics(aggregated_metrics, selection_metrics)
+                    children, actions_to_children, expansion_budget, expansion_metrics = self.expansion(
+                        node, selection_env
+                    )
+                    utils.update_metrics(aggregated_metrics, expansion_metrics)
+                    self.remaining_budget -= selection_budget + expansion_budget
+
+                    # Children that are in flight in another thread (existing leaves merged by the expansion) are
+                    # already being simulated
+                    children_and_actions = [
+                        (child, action)
+                        for child, action in zip(children, actions_to_children)
+                        if not self.graph.is_in_flight(child)
+                    ]
+                    children = [child for child, _ in children_and_actions]
+                    actions_to_children = [action for _, action in children_and_actions]
+                    actions, action_failure_probabilities = self.draw_rollouts(actions_to_children, selection_env)
+
+                    # Other threads skip the children until their rollouts are backpropagated
+                    for child in children:
+                        self.graph.set_in_flight(child, True)
+                    self.in_flight_nodes += len(children)
+
+                if len(children) == 0:
+                    continue
+
+                start_time = time.perf_counter()
+                results = self.rollout_executor.run(selection_env, actions, action_failure_probabilities)
+                rewards, paths = [reward for reward, _ in results], [path for _, path in results]
+
+                with self.graph_lock:
+                    simulations, simulation_metrics = self.group_simulations(
+                        actions_to_children, rewards, paths, start_time
+                    )
+                    utils.update_metrics(aggregated_metrics, simulation_metrics)
+                    for child, (_, trajectories, simulation_budget) in zip(children, simulations):
+                        self.graph.set_in_flight(child, False)
+                        self.store_and_backpropagate(trajectories, aggregated_metrics)
+                        self.remaining_budget -= simulation_budget
+                    self.in_flight_nodes -= len(children)
+                    self.iterations += 1
+                    self.search_condition.notify_all()
+
+        except Exception as error:  # Raised again by threaded_search
+            with self.graph_lock:
+                self.search_errors.append(error)
+                self.search_condition.notify_all()
+
     def act(self, action):
         return self.env.stochastic_step(action, self.random.random_sample())
 
-    def selection(self, env):
+    def selection(self):
 
         start_time = time.perf_counter()
         if self.root_node.is_leaf:
-            return self.root_node, 0, {}
+            return self.root_node, self.env.copy(), 0, {}
 
         node = self.graph.select_frontier_node(
             noisy=self.config.selection.use_noisy_frontier_selection,
@@ -154,10 +275,11 @@ class MCGSAgent:
         )
 
         if node is None:  # If no frontier node was found, select the root node
-            return self.root_node, 0, {}
+            return self.root_node, self.env.copy(), 0, {}
 
         start_go_to_node = time.perf_counter()
-        selected_node, spent_budget = self.go_to_node(node, env)
+        env, path, restored_steps = self.restore_snapshot(node)
+        selected_node, spent_budget = self.go_to_node(node, env, path)
         end_got_to_node = time.perf_counter()
 
         end_time = time.perf_counter()
@@ -165,8 +287,22 @@ class MCGSAgent:
             "go_to_node_time": (end_got_to_node - start_go_to_node),
             "selection_time": (end_time - start_time),
             "selection_spent_budget": spent_budget,
+            "selection_restored_steps": restored_steps,
         }
-        return selected_node, spent_budget, metrics
+        return selected_node, env, spent_budget, metrics
+
+    def restore_snapshot(self, destination_node):
+
+        if self.snapshots is None:
+            return self.env.copy(), None, 0
+
+        # Restore the deepest snapshot on the path from the root, and only replay the rest of the path
+        node_ids, actions = self.graph.get_path(self.root_node, destination_node)
+        for idx in reversed(range(1, len(node_ids))):
+            snapshot = self.snapshots.get(node_ids[idx], depth=idx)
+            if snapshot is not None:
+                return snapshot.copy(), (node_ids[idx:], actions[idx:]), idx
+        return self.env.copy(), (node_ids, actions), 0
 
     def expansion(self, node, env):
 
@@ -187,19 +323,36 @@ class MCGSAgent:
 
         for action in range(self.env.action_space.n):
 
-            expansion_env = env.copy()
-            state, reward, terminated, truncated, info = expansion_env.step(action)
-            # Do we need it here, since it's already tracked in custom_minigrid_env.py -> step() # Maybe we don't ne
-            spent_budget += 1
-            current_observation = expansion_env.get_observation()
+            transition = None if self.transitions is None else self.transitions.get(node.id, action)
+            if transition is None and self.snapshots is None:
+                # The children are only looked at, so the step is done on env and reverted instead of on a copy
+                expansion_env = None
+                state, reward, terminated, truncated, info = env.step_with_undo(action)
+                spent_budget += 1
+                current_observation = env.get_observation()
+                env.undo()
+            elif transition is None:
+                expansion_env = env.copy()
+                state, reward, terminated, truncated, info = expansion_env.step(action)
+                # Do we need it here, since it's already tracked in custom_minigrid_env.py -> step() # Maybe we don't ne
+                spent_budget += 1
+                current_observation = expansion_env.get_observation()
+            else:
+                expansion_env = None
+                next_node_id, reward, terminated, truncated = transition
+                current_observation = self.graph.get_node_info(next_node_id).observation
             # TODO: parent in unreachable
             if node.unreachable and node != self.root_node:
                 raise AssertionError("Expansion Parent node is unreachable", node.chosen, node.observation)
 
             child, reward = self.add_new_observation(current_observation, node, action, reward, terminated, truncated)
+            if self.transitions is not None and transition is None:
+                self.cache_transition(node.observation, action, current_observation, reward, terminated, truncated)
             if child is not None:
                 new_nodes.append(child)
                 actions_to_new_nodes.append(action)
+                if self.snapshots is not None and expansion_env is not None and node.id in self.graph.paths:
+                    self.snapshots.add(child.id, expansion_env, depth=self.graph.paths.get_distance(node.id) + 1)
             else:
                 merged_nodes += 1
         end_time = time.perf_counter()
@@ -248,6 +401,144 @@ class MCGSAgent:
 
         return np.mean(rewards), trajectories, spent_budget_simulation, metrics
 
+    def batch_simulation(self, actions_to_children, env):
+
+        # Runs the rollouts of all children in lockstep, and returns the same results as simulation() for each child
+        start_time = time.perf_counter()
+
+        actions, action_failure_probabilities = self.draw_rollouts(actions_to_children, env)
+        if self.batch_env is None or self.batch_env.batch_size < len(actions):
+            self.batch_env = env.make_batch(len(actions))
+
+        rewards, paths = self.run_batch_rollouts(self.batch_env, env, actions, action_failure_probabilities)
+        return self.group_simulations(actions_to_children, rewards, paths, start_time)
+
+    def run_batch_rollouts(self, batch_env, env, actions, action_failure_probabilities):
+
+        # Rows that are not part of this iteration stay inactive
+        batch_size = len(actions)
+        padding = batch_env.batch_size - batch_size
+        actions = np.pad(actions, ((0, padding), (0, 0)))
+        action_failure_probabilities = np.pad(action_failure_probabilities, ((0, padding), (0, 0)), constant_values=1)
+
+        batch_env.load(0, env)
+        for row in range(1, batch_size):
+            batch_env.copy_row(0, row)
+
+        paths = [[] for _ in range(batch_size)]
+        previous_observations = [env.get_observation()] * batch_size
+        cumulative_rewards = np.zeros(batch_env.batch_size)
+        active = np.zeros(batch_env.batch_size, dtype=np.bool_)
+        active[:batch_size] = True
+        for idx in range(actions.shape[1]):
+            rewards, terminated, truncated = batch_env.stochastic_step(
+                actions[:, idx], action_failure_probabilities[:, idx], active
+            )
+            cumulative_rewards += rewards
+            for row in np.flatnonzero(active).tolist():
+                observation = batch_env.get_observation(row)
+                paths[row].append(
+                    (
+                        previous_observations[row],
+                        observation,
+                        actions.item(row, idx),
+                        rewards.item(row),
+                        terminated.item(row),
+                        truncated.item(row),
+                    )
+                )
+                previous_observations[row] = observation
+            active &= ~(terminated | truncated)
+            if not active.any():
+                break
+
+        return cumulative_rewards[:batch_size].tolist(), paths
+
+    def parallel_simulation(self, actions_to_children, env):
+
+        # Runs the rollouts of all children in the worker processes, and returns the same results as batch_simulation()
+        start_time = time.perf_counter()
+
+        actions, action_failure_probabilities = self.draw_rollouts(actions_to_children, env)
+        results = self.rollout_executor.run(env, actions, action_failure_probabilities)
+
+        rewards = [reward for reward, _ in results]
+        paths = [path for _, path in results]
+        return self.group_simulations(actions_to_children, rewards, paths, start_time)
+
+    def draw_rollouts(self, actions_to_children, env):
+
+        # One row of actions and failure probabilities per (child, rollout), drawn in the order of simulation()
+        previous_node = self.graph.get_node_by_observation(env.get_observation())
+        if previous_node.unreachable and previous_node != self.root_node:
+            raise AssertionError("Rollout First node is unreachable", previous_node.chosen, previous_node.observation)
+
+        num_rollouts = self.config.search.num_rollouts
+        rollout_depth = self.config.search.rollout_depth
+        num_rows = len(actions_to_children) * num_rollouts
+        actions = np.zeros((num_rows, rollout_depth + 1), dtype=np.int64)
+        action_failure_probabilities = np.zeros((num_rows, rollout_depth + 1))
+        for row in range(num_rows):
+            allowed_actions = range(self.env.action_space.n)
+            if self.config.use_disabled_actions:
+                action_to_remove = (row % num_rollouts) % self.env.action_space.n
+                allowed_actions.remove(action_to_remove)
+
+            actions[row, 0] = actions_to_children[row // num_rollouts]
+            actions[row, 1:] = self.random.choice(allowed_actions, rollout_depth)
+            action_failure_probabilities[row] = self.random.random_sample(rollout_depth + 1)
+
+        return actions, action_failure_probabilities
+
+    def group_simulations(self, actions_to_children, rewards, paths, start_time):
+
+        num_rollouts = self.config.search.num_rollouts
+        simulations = []
+        for child_idx in range(len(actions_to_children)):
+            rows = range(child_idx * num_rollouts, (child_idx + 1) * num_rollouts)
+            simulations.append(
+                (
+                    np.mean([rewards[row] for row in rows]),
+                    [paths[row] for row in rows],
+                    sum(len(paths[row]) for row in rows),
+                )
+            )
+            self.num_simulations += 1
+
+        end_time = time.perf_counter()
+        metrics = {
+            "simulation_time": (end_time - start_time),
+            "simulation_spent_budget": sum(simulation[2] for simulation in simulations),
+            "average_reward": np.mean(rewards),
+        }
+        return simulations, metrics
+
+    def store_and_backpropagate(self, trajectories, aggregated_metrics):
+
+        for trajectory in trajectories:
+            first_node = self.graph.get_node_by_observation(trajectory[0][0])
+            if first_node.unreachable and first_node != self.root_node:
+                raise AssertionError("Before storrout Rollout First node is unreachable", first_node.chosen)
+        # Storing rollouts
+        if self.config.stored_rollouts.use_stored_rollouts:
+            storing_nodes_metrics = self.add_stored_nodes(trajectories)
+            utils.update_metrics(aggregated_metrics, storing_nodes_metrics)
+
+        if self.transitions is not None:
+            for trajectory in trajectories:
+                for transition in trajectory:
+                    self.cache_transition(*transition)
+
+        # Backpropagation
+        if self.config.use_backpropagation:
+            start_backprop_time = time.perf_counter()
+            if self.config.stored_rollouts.use_stored_rollouts:
+                for trajectory in trajectories:
+                    self.backpropagation(trajectory)
+            end_backprop_time = time.perf_counter()
+            backprop_metrics = {"backpropagation_time": (end_backprop_time - start_backprop_time)}
+            utils.update_metrics(aggregated_metrics, backprop_metrics)
+
     def backpropagation(self, trajectory):
 
         # Trajectory is a list of tuples (parent_obs, current_obs, action, reward, terminated, truncated)
@@ -260,17 +551,17 @@ class MCGSAgent:
             parent_observation = transition[1]
             reward = transition[3]
             if not (observation == parent_observation and reward == 0):
-                non_obsolete_nodes.append(self.graph.get_node_info(transition[0]))
+                non_obsolete_nodes.append(self.graph.get_node_by_observation(transition[0]))
                 total_rollout_reward += reward
 
         # TODO: check if need to add the last node to the list
-        non_obsolete_nodes.append(self.graph.get_node_info(trajectory[-1][1]))
+        non_obsolete_nodes.append(self.graph.get_node_by_observation(trajectory[-1][1]))
 
         # creates a list of rolled out nodes from last to first
         node_list = list(reversed(non_obsolete_nodes))
 
         # adds a list of nodes to the root from the last node (before rollout) to the root
-        node = self.graph.get_node_info(trajectory[0][0])
+        node = self.graph.get_node_by_observation(trajectory[0][0])
 
         n = 0
         while node is not None:
@@ -280,19 +571,78 @@ class MCGSAgent:
             assert n < 200, "Backpropagation loop"
 
         i = 1  # backprop discount factor
-        nodes_updated = []
+        nodes_updated = set()
         for node in node_list:
-            if node.observation not in nodes_updated:
-                nodes_updated.append(node.observation)
-                node.visits += 1
-                node.total_value += total_rollout_reward * np.power(self.config.search.discount_factor, i)
-                node.max_value = max(
-                    node.max_value, total_rollout_reward * np.power(self.config.search.discount_factor, i)
+            if node.id not in nodes_updated:
+                nodes_updated.add(node.id)
+                self.graph.update_node_value(
+                    node, total_rollout_reward * np.power(self.config.search.discount_factor, i)
                 )
                 i += 1
 
+    def cache_transition(self, parent_observation, action, observation, reward, terminated, truncated):
+        # Transitions are only cached between nodes of the graph
+        parent_id = self.graph.get_node_id(parent_observation)
+        node_id = self.graph.get_node_id(observation)
+        if parent_id is not None and node_id is not None:
+            self.transitions.add(parent_id, action, node_id, reward, terminated, truncated)
+
+    def cached_rollout(self, action_to_node, env, action_list):
+
+        # Follows the cached transitions wherever they are known, and only steps the environment on unknown ones.
+        # Before an unknown step, the environment catches up with the rollout from the deepest snapshot of the
+        # cached steps it missed, and only replays the cached steps after it. Only the steps of the environment
+        # are spent budget
+        path = []
+        spent_budget = 0
+        cumulative_reward = 0
+        actions = [action_to_node] + list(action_list)
+
+        observation = env.get_observation()
+        node_id = self.graph.get_node_id(observation)
+        depth = None if self.snapshots is None else self.graph.paths.get_distance(node_id)
+
+        rollout_env = None  # Copied from env at the first unknown transition
+        env_idx = 0  # Number of actions done by the rollout environment
+        restored_idx, restored_env = 0, None
+        for idx, action in enumerate(actions):
+            transition = None if node_id is None else self.transitions.get(node_id, action)
+            if transition is not None:
+                node_id, reward, terminated, truncated = transition
+                next_observation = self.graph.get_node_info(node_id).observation
+                if depth is not None:
+                    snapshot = self.snapshots.get(node_id, depth=depth + idx + 1)
+                    if snapshot is not None:
+                        restored_idx, restored_env = idx + 1, snapshot
+            else:
+                if restored_env is not None:
+                    rollout_env = restored_env.copy()
+                    env_idx, restored_env = restored_idx, None
+                elif rollout_env is None:
+                    rollout_env = env.copy()
+                for replayed_action in actions[env_idx:idx]:
+                    rollout_env.step(replayed_action)
+                    spent_budget += 1
+
+                state, reward, terminated, truncated, info = rollout_env.step(action)
+                spent_budget += 1
+                env_idx = idx + 1
+                next_observation = rollout_env.get_observation()
+                node_id = self.graph.get_node_id(next_observation)
+
+            cumulative_reward += reward
+            path.append((observation, next_observation, action, reward, terminated, truncated))
+            observation = next_observation
+            if terminated or truncated:
+                break
+
+        return cumulative_reward, path, spent_budget
+
     def rollout(self, action_to_node, env, action_list, action_failure_probabilities):
 
+        if self.transitions is not None:  # The environment is deterministic, so failure probabilities are not used
+            return self.cached_rollout(action_to_node, env, action_list)
+
         path = []
         spent_budget = 0
         cumulative_reward = 0
@@ -300,7 +650,7 @@ class MCGSAgent:
         rollout_env = env.copy()
         previous_observation = rollout_env.get_observation()
 
-        previous_node = self.graph.get_node_info(previous_observation)
+        previous_node = self.graph.get_node_by_observation(previous_observation)
         if previous_node.unreachable and previous_node != self.root_node:
             raise AssertionError("Rollout First node is unreachable", previous_node.chosen, previous_node.observation)
 
@@ -341,7 +691,8 @@ class MCGSAgent:
         # Don't add the node if nothing has changed in the observation
         if current_observation != parent_node.observation:
             # If the node is not in the graph, create it and add it to the graph
-            if not self.graph.has_node(current_observation):
+            child_id = self.graph.get_node_id(current_observation)
+            if child_id is None:
 
                 child_node = Node(
                     observation=current_observation,
@@ -356,6 +707,7 @@ class MCGSAgent:
                     config=self.config,
                 )
                 self.graph.add_node(child_node)
+                child_node = self.graph.get_node_info(child_node.id)
                 self.novelty.update_posterior(
                     child_node.observation,
                     child_node.terminated,
@@ -366,11 +718,11 @@ class MCGSAgent:
                 new_node = child_node
             else:
                 # enable for FMC optimisation, comment for full exploration
-                child_node = self.graph.get_node_info(current_observation)  # TODO: why is this here?
+                child_node = self.graph.get_node_info(child_id)  # TODO: why is this here?
                 if child_node.is_leaf:
                     new_node = child_node
 
-            if not self.graph.has_edge_by_observations(parent_node.observation, child_node.observation):
+            if not self.graph.has_edge_by_ids(parent_node.id, child_node.id):
                 _ = self.add_edge(parent_node, child_node, action, reward, terminated, truncated)
 
         return new_node, reward
@@ -385,7 +737,7 @@ class MCGSAgent:
         for trajectory in trajectories:
 
             # TODO: How is the parent of the first node unreachable?? - Solved?
-            first_node = self.graph.get_node_info(trajectory[0][0])
+            first_node = self.graph.get_node_by_observation(trajectory[0][0])
             if first_node.unreachable and first_node != self.root_node:
                 raise AssertionError("Stored Rollout First node is unreachable", first_node.chosen)
 
@@ -398,18 +750,24 @@ class MCGSAgent:
                 terminated = transition[4]
                 truncated = transition[5]
 
-                novelty = self.novelty.calculate_novelty(observation)
-
-                node_is_new = self.graph.has_node(observation) is False
-                edge_is_new = self.graph.has_edge_by_observations(parent_observation, observation) is False
-                novelty_criteria = novelty > 0 or self.config.stored_rollouts.only_store_novel_nodes is False
+                parent_id = self.graph.get_node_id(parent_observation)
+                node_id = self.graph.get_node_id(observation)
+                node_is_new = node_id is None
+                edge_is_new = node_is_new or self.graph.has_edge_by_ids(parent_id, node_id) is False
+                # Novelty is only computed when it decides whether the node is stored
+                novelty_criteria = self.config.stored_rollouts.only_store_novel_nodes is False
+                if not novelty_criteria:
+                    novelty_criteria = self.novelty.calculate_novelty(observation) > 0
 
                 # If the parent node is unreachable, make it reachable and through the trajectory parent
-                parent_node = self.graph.get_node_info(parent_observation)
+                parent_node = self.graph.get_node_info(parent_id)
                 if parent_node.unreachable and parent_node != self.root_node:
-                    parent_node.parent = self.graph.get_node_info(trajectory[idx - 1][0])
-                    parent_node.action = trajectory[idx - 1][2]
-                    parent_node.unreachable = False
+                    self.graph.set_parent(
+                        parent_node,
+                        self.graph.get_node_by_observation(trajectory[idx - 1][0]),
+                        trajectory[idx - 1][2],
+                    )
+                    self.graph.set_unreachable(parent_node, False)
 
                 if node_is_new or edge_is_new:
                     if novelty_criteria:
@@ -442,60 +800,69 @@ class MCGSAgent:
     def maintain_graph(self):
         start_time = time.perf_counter()
         self.set_root_node()
-        self.graph.reroute_all()
+        self.graph.reroute_changed()
+        if self.snapshots is not None:  # Snapshot depths are relative to the previous root
+            self.snapshots.clear()
         end_time = time.perf_counter()
         maintenance_metrics = {"maintenance_time": (end_time - start_time)}
         return maintenance_metrics
 
-    def go_to_node(self, destination_node, env):
+    def go_to_node(self, destination_node, env, path=None):
 
-        observation = env.get_observation()
-        node = self.graph.get_node_info(observation)
-        assert node == self.root_node
+        # env is either at the root, or at the first node of the given path if it was restored from a snapshot
+        node = self.graph.get_node_by_observation(env.get_observation())
+        assert node == self.root_node or (path is not None and node.id == path[0][0])
 
         spent_budget = 0
-        reached_destination = False
+        reached_destination = node == destination_node
         truncated = env.truncated
-        while self.graph.has_path(node, destination_node) and not reached_destination:
+        parent_node = node
+        while (path is not None or self.graph.has_path(node, destination_node)) and not reached_destination:
 
-            observations, actions = self.graph.get_path(node, destination_node)
+            node_ids, actions = path if path is not None else self.graph.get_path(node, destination_node)
+            path = None
 
             # For each action in the path, do one step in the environment
+            parent_node = node
             for idx, action in enumerate(actions):
-                previous_observation = env.get_observation()
-                parent_node = self.graph.get_node_info(previous_observation)
 
                 if truncated:
-                    return self.graph.get_node_info(previous_observation), spent_budget
+                    return parent_node, spent_budget
 
                 state, reward, terminated, truncated, info = env.step(action)
                 spent_budget += 1
                 current_observation = env.get_observation()
+                current_id = self.graph.get_node_id(current_observation)
 
                 # If the observation is not in the graph, add it. (happens in stochastic environments)
-                if not self.graph.has_node(current_observation):
+                if current_id is None:
                     self.add_new_observation(current_observation, parent_node, action, reward, terminated, truncated)
+                    current_id = self.graph.get_node_id(current_observation)
 
-                elif not self.graph.has_edge_by_observations(parent_node.observation, current_observation):
+                elif not self.graph.has_edge_by_ids(parent_node.id, current_id):
                     self.add_edge(
                         parent_node=parent_node,
-                        child_node=self.graph.get_node_info(current_observation),
+                        child_node=self.graph.get_node_info(current_id),
                         action=action,
                         reward=reward,
                         terminated=terminated,
                         truncated=truncated,
                     )
 
+                if self.transitions is not None:
+                    self.transitions.add(parent_node.id, action, current_id, reward, terminated, truncated)
+                parent_node = self.graph.get_node_info(current_id)
+
                 # if the observation has changed, we need to update the path (happens in stochastic environments)
-                if observations[idx + 1] != current_observation:
-                    node = self.graph.get_node_info(current_observation)
+                if node_ids[idx + 1] != current_id:
+                    node = parent_node
                     break
 
-                if destination_node.observation == current_observation:
+                if destination_node.id == current_id:
                     reached_destination = True
                     break
 
-        return self.graph.get_node_info(current_observation), spent_budget
+        return parent_node, spent_budget
 
     def add_edge(self, parent_node, child_node, action, reward, terminated, truncated):
 
@@ -515,9 +882,8 @@ class MCGSAgent:
 
             # If child was unreachable make it reachable again and update its parent
             if child_node.unreachable is True and child_node != self.root_node:
-                child_node.set_parent(parent_node)
-                child_node.action = action
-                child_node.unreachable = False
+                self.graph.set_parent(child_node, parent_node, action)
+                self.graph.set_unreachable(child_node, False)
 
         return edge
 
@@ -527,21 +893,20 @@ class MCGSAgent:
 
         # Record the old root node
         old_root_node = self.root_node
-        new_root_id = self.env.get_observation()
-        self.root_node = self.graph.get_node_info(new_root_id)
+        self.root_node = self.graph.get_node_by_observation(self.env.get_observation())
         self.graph.set_root_node(self.root_node)
 
         # Set new root node as chosen
         self.root_node.chosen = True
-        self.root_node.parent = None
+        self.graph.set_parent(self.root_node, None, self.root_node.action)
 
         # If we changed root, reroute old root to new route
-        if self.root_node.observation != old_root_node.observation:
+        if self.root_node.id != old_root_node.id:
             if self.graph.has_path(self.root_node, old_root_node):
                 self.graph.reroute_path(self.root_node, old_root_node)
                 old_root_node.action = self.graph.get_edge_info(old_root_node.parent, old_root_node).action
             else:
-                old_root_node.unreachable = True
+                self.graph.set_unreachable(old_root_node, True)
 
     def select_best_move(self, node, criteria):
 
@@ -567,6 +932,31 @@ class MCGSAgent:
         metrics = {"select_move_time": (end_time - start_time)}
         return best_node, edge.action, metrics
 
+    def get_root_child_statistics(self, action):
+
+        # Statistics of every child of the root, and how good the move that select_best_move chose (action) is
+        statistics = {}
+        for child_id in self.graph.get_successor_ids(self.root_node.id):
+            child = self.graph.get_node_info(child_id)
+            statistics[self.graph.get_edge_info(self.root_node, child).action] = {
+                "visits": child.visits,
+                "total_value": child.total_value,
+                "max_value": child.max_value,
+                "done_distance": None,
+                "best_value": None,
+            }
+
+        if action in statistics:
+            done_node = None
+            if self.config.search.best_node_criteria == "closest":
+                done_node = self.graph.get_closest_done_node(only_reachable=True)
+            if done_node is not None:
+                statistics[action]["done_distance"] = self.graph.get_path_length(self.root_node, done_node)
+            else:
+                best_node = self.graph.get_best_node(only_reachable=True)
+                statistics[action]["best_value"] = self.graph.get_best_node_value(best_node)
+        return statistics
+
     def get_final_metrics(self, done, total_reward):
 
         metrics = {
@@ -577,3 +967,7 @@ class MCGSAgent:
         subgoal_metrics = self.novelty.get_subgoal_metrics()
         metrics.update(subgoal_metrics)
         return metrics
+
+    def close(self):
+        if self.rollout_executor is not None:
+            self.rollout_executor.shutdown()
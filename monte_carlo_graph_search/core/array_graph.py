@@ -0,0 +1,243 @@
+import networkx as nx
+import numpy as np
+
+from monte_carlo_graph_search.core.edge import Edge
+from monte_carlo_graph_search.core.graph import Graph
+from monte_carlo_graph_search.core.node import Node
+
+# (name, dtype, empty value) of every node field that is kept in a parallel array
+NODE_FIELDS = [
+    ("parent", np.int64, -1),
+    ("action", np.int8, -1),
+    ("is_leaf", np.bool_, False),
+    ("terminated", np.bool_, False),
+    ("truncated", np.bool_, False),
+    ("visits", np.int64, 0),
+    ("total_value", np.float64, 0),
+    ("max_value", np.float64, 0),
+    ("novelty_value", np.float64, 0),
+    ("chosen", np.bool_, False),
+    ("unreachable", np.bool_, False),
+]
+
+EDGE_FIELDS = [
+    ("node_from", np.int64, -1),
+    ("node_to", np.int64, -1),
+    ("action", np.int8, -1),
+    ("reward", np.float64, 0),
+    ("terminated", np.bool_, False),
+    ("truncated", np.bool_, False),
+]
+
+
+def node_field(name):
+    array_name = f"node_{name}"
+
+    def getter(self):
+        return getattr(self.graph, array_name).item(self.id)
+
+    def setter(self, value):
+        getattr(self.graph, array_name)[self.id] = value
+
+    return property(getter, setter)
+
+
+def optional_id_field(name, to_node):
+    # Fields that hold a reference (parent) or an optional value (action) store -1 for None
+    array_name = f"node_{name}"
+
+    def getter(self):
+        value = getattr(self.graph, array_name).item(self.id)
+        if value == -1:
+            return None
+        return self.graph.get_node_info(value) if to_node else value
+
+    def setter(self, value):
+        if value is None:
+            value = -1
+        elif to_node:
+            value = value.id
+        getattr(self.graph, array_name)[self.id] = value
+
+    return property(getter, setter)
+
+
+class ArrayNode(Node):
+    """
+    View of a node whose fields live in the parallel arrays of an ArrayGraph
+    """
+
+    __slots__ = ("graph", "id")
+
+    parent = optional_id_field("parent", to_node=True)
+    action = optional_id_field("action", to_node=False)
+    is_leaf = node_field("is_leaf")
+    terminated = node_field("terminated")
+    truncated = node_field("truncated")
+    visits = node_field("visits")
+    total_value = node_field("total_value")
+    max_value = node_field("max_value")
+    novelty_value = node_field("novelty_value")
+    chosen = node_field("chosen")
+    unreachable = node_field("unreachable")
+
+    def __init__(self, graph, node_id):
+        self.graph = graph
+        self.id = node_id
+
+    @property
+    def observation(self):
+        return self.graph.observations[self.id]
+
+    def __eq__(self, other):
+        return isinstance(other, ArrayNode) and self.id == other.id and self.graph is other.graph
+
+    def __hash__(self):
+        return hash(self.id)
+
+
+class ArrayGraph(Graph):
+    """
+    Graph backend that stores nodes and edges in growable NumPy arrays instead of a networkx.DiGraph.
+    Node fields are parallel arrays indexed by node id, edges are parallel arrays indexed by edge id,
+    and the adjacency is a per-node table of outgoing edge ids (one slot per distinct child).
+    """
+
+    def __init__(self, seed, config, initial_capacity=1024, initial_slots=8):
+        super().__init__(seed, config)
+        self.graph = None
+        self.clear(initial_capacity, initial_slots)
+
+    def clear(self, initial_capacity=1024, initial_slots=8):
+
+        self.observations = []
+        self.observation_ids = {}
+        self.number_of_edges = 0
+
+        self.node_capacity = initial_capacity
+        for name, dtype, empty in NODE_FIELDS:
+            setattr(self, f"node_{name}", np.full(initial_capacity, empty, dtype=dtype))
+        self.out_degree = np.zeros(initial_capacity, dtype=np.int32)
+        self.successor_edges = np.full((initial_capacity, initial_slots), -1, dtype=np.int64)
+
+        self.edge_capacity = initial_capacity
+        for name, dtype, empty in EDGE_FIELDS:
+            setattr(self, f"edge_{name}", np.full(initial_capacity, empty, dtype=dtype))
+
+    def grow_nodes(self):
+        new_capacity = self.node_capacity * 2
+        for name, dtype, empty in NODE_FIELDS:
+            setattr(self, f"node_{name}", grow_array(getattr(self, f"node_{name}"), new_capacity, empty))
+        self.out_degree = grow_array(self.out_degree, new_capacity, 0)
+        self.successor_edges = grow_array(self.successor_edges, new_capacity, -1)
+        self.node_capacity = new_capacity
+
+    def grow_edges(self):
+        new_capacity = self.edge_capacity * 2
+        for name, dtype, empty in EDGE_FIELDS:
+            setattr(self, f"edge_{name}", grow_array(getattr(self, f"edge_{name}"), new_capacity, empty))
+        self.edge_capacity = new_capacity
+
+    def grow_slots(self):
+        rows, slots = self.successor_edges.shape
+        successor_edges = np.full((rows, slots * 2), -1, dtype=np.int64)
+        successor_edges[:, :slots] = self.successor_edges
+        self.successor_edges = successor_edges
+
+    def add_node(self, node):
+
+        if node.observation not in self.observation_ids:
+            node_id = len(self.observations)
+            if node_id == self.node_capacity:
+                self.grow_nodes()
+
+            node.id = node_id
+            self.observation_ids[node.observation] = node_id
+            self.observations.append(node.observation)
+            for name, _, _ in NODE_FIELDS:
+                setattr(ArrayNode(self, node_id), name, getattr(node, name))
+            self.index_node(self.get_node_info(node_id))
+            return True
+        return False
+
+    def add_edge(self, edge):
+        edge_id = self.number_of_edges
+        if edge_id == self.edge_capacity:
+            self.grow_edges()
+
+        node_from = edge.node_from.id
+        self.edge_node_from[edge_id] = node_from
+        self.edge_node_to[edge_id] = edge.node_to.id
+        self.edge_action[edge_id] = edge.action
+        self.edge_reward[edge_id] = edge.reward
+        self.edge_terminated[edge_id] = edge.terminated
+        self.edge_truncated[edge_id] = edge.truncated
+        self.number_of_edges += 1
+
+        slot = self.out_degree[node_from]
+        if slot == self.successor_edges.shape[1]:
+            self.grow_slots()
+        self.successor_edges[node_from, slot] = edge_id
+        self.out_degree[node_from] += 1
+        self.paths.add_edge(self, node_from, edge.node_to.id)
+
+    def get_out_edge_ids(self, node_id):
+        return self.successor_edges[node_id, : self.out_degree[node_id]]
+
+    def get_edge_id(self, node_from_id, node_to_id):
+        for edge_id in self.get_out_edge_ids(node_from_id).tolist():
+            if self.edge_node_to[edge_id] == node_to_id:
+                return edge_id
+        return None
+
+    def get_node_info(self, node_id):
+        return ArrayNode(self, node_id)
+
+    def get_all_nodes_info(self):
+        return [ArrayNode(self, node_id) for node_id in range(len(self.observations))]
+
+    def has_edge_by_ids(self, node_from_id, node_to_id):
+        return self.get_edge_id(node_from_id, node_to_id) is not None
+
+    def get_successor_ids(self, node_id):
+        return self.edge_node_to[self.get_out_edge_ids(node_id)].tolist()
+
+    def get_child_with_action(self, identifier, action):
+        for edge_id in self.get_out_edge_ids(identifier).tolist():
+            if self.edge_action[edge_id] == action:
+                return self.edge_node_to.item(edge_id)  # return child node
+        return None
+
+    def get_number_of_nodes(self):
+        return len(self.observations)
+
+    def get_number_of_edges(self):
+        return self.number_of_edges
+
+    def get_edge_info_by_ids(self, node_from_id, node_to_id):
+        edge_id = self.get_edge_id(node_from_id, node_to_id)
+        return Edge(
+            edge_id=edge_id,
+            node_from=ArrayNode(self, node_from_id),
+            node_to=ArrayNode(self, node_to_id),
+            action=self.edge_action.item(edge_id),
+            reward=self.edge_reward.item(edge_id),
+            terminated=self.edge_terminated.item(edge_id),
+            truncated=self.edge_truncated.item(edge_id),
+        )
+
+    def to_networkx(self):
+        graph = nx.DiGraph()
+        for node in self.get_all_nodes_info():
+            graph.add_node(node.id, info=node)
+        for edge_id in range(self.number_of_edges):
+            node_from_id = self.edge_node_from.item(edge_id)
+            node_to_id = self.edge_node_to.item(edge_id)
+            graph.add_edge(node_from_id, node_to_id, info=self.get_edge_info_by_ids(node_from_id, node_to_id))
+        return graph
+
+
+def grow_array(array, new_capacity, empty):
+    grown = np.full((new_capacity,) + array.shape[1:], empty, dtype=array.dtype)
+    grown[: len(array)] = array
+    return grown
@@ -0,0 +1,55 @@
+import heapq
+
+
+class BestNodeIndex:
+    """
+    Incrementally maintained max-heap over the best node value of every node in the graph.
+    Nodes whose value, parent or reachability changed are only marked as dirty, and their
+    value is recomputed on the next query, so a query costs O(changed nodes * log n) instead of O(n).
+    """
+
+    def __init__(self):
+        self.heap = []
+        self.entries = {}  # node id -> latest heap entry
+        self.dirty = set()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def invalidate(self, node):
+        self.dirty.add(node.id)
+
+    def select(self, graph, root_node):
+
+        for node_id in self.dirty:
+            node = graph.get_node_info(node_id)
+            if node.unreachable or node.parent is None:
+                self.entries.pop(node_id, None)
+                continue
+            # Ties are broken by the node id, which is the insertion order of the node
+            entry = (-graph.get_best_node_value(node), node_id)
+            self.entries[node_id] = entry
+            heapq.heappush(self.heap, entry)
+        self.dirty.clear()
+
+        if len(self.heap) > 2 * len(self.entries) + 64:
+            self.heap = list(self.entries.values())
+            heapq.heapify(self.heap)
+
+        best_node = None
+        root_entry = None
+        while self.heap:
+            entry = self.heap[0]
+            node_id = entry[1]
+            if self.entries.get(node_id) is not entry:  # Stale entry
+                heapq.heappop(self.heap)
+            elif node_id == root_node.id:  # The root is never the best node, but it will be after the root moves
+                root_entry = heapq.heappop(self.heap)
+            else:
+                best_node = graph.get_node_info(node_id)
+                break
+
+        if root_entry is not None:
+            heapq.heappush(self.heap, root_entry)
+
+        return best_node
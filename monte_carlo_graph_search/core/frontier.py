@@ -0,0 +1,163 @@
+import heapq
+
+import numpy as np
+
+
+class Frontier:
+    """
+    Indexed frontier with O(1) membership and removal, and a lazy max-heap on
+    uct_value + novelty_factor * novelty_value for O(log n) selection.
+    Heap entries are invalidated instead of removed: an entry is only valid while it is
+    the latest entry pushed for its node, and unreachable nodes are skipped at selection time.
+    The heap is only built by the first select, and it is rebuilt when stale entries outnumber the nodes.
+
+    Values, novelty and reachability are also kept in contiguous slot arrays (in insertion order),
+    so that noisy selection is a single vectorized argmax over the whole frontier.
+    Nodes that are in flight (their rollouts are still running in another search thread) are not selectable.
+    """
+
+    def __init__(self, initial_capacity=1024):
+        self.nodes = {}  # node id -> node, in insertion order
+        self.orders = {}  # node id -> insertion order, which breaks ties between equal priorities
+        self.entries = {}  # node id -> latest heap entry
+        self.heap = None  # Not kept up to date until select is used, noisy selection only reads the slot arrays
+        self.novelty_factor = 0
+        self.counter = 0
+
+        self.slots = {}  # node id -> slot in the arrays
+        self.size = 0
+        self.node_ids = np.zeros(initial_capacity, dtype=np.int64)
+        self.values = np.zeros(initial_capacity, dtype=np.float64)
+        self.novelty = np.zeros(initial_capacity, dtype=np.float64)
+        self.reachable = np.zeros(initial_capacity, dtype=np.bool_)
+        self.active = np.zeros(initial_capacity, dtype=np.bool_)
+        self.in_flight = np.zeros(initial_capacity, dtype=np.bool_)
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def __iter__(self):
+        return iter(self.nodes.values())
+
+    def __contains__(self, node):
+        return node.id in self.nodes
+
+    def add(self, node):
+        self.nodes[node.id] = node
+        self.orders[node.id] = self.counter
+        self.counter += 1
+        if self.heap is not None:
+            self.push(node)
+
+        if self.size == len(self.node_ids):
+            self.resize(2 * len(self.node_ids))
+        slot = self.size
+        self.slots[node.id] = slot
+        self.node_ids[slot] = node.id
+        self.values[slot] = node.uct_value()
+        self.novelty[slot] = node.novelty_value
+        self.reachable[slot] = not node.unreachable
+        self.active[slot] = True
+        self.in_flight[slot] = False
+        self.size += 1
+
+    def remove(self, node):
+        del self.nodes[node.id]
+        del self.orders[node.id]
+        self.entries.pop(node.id, None)
+        self.active[self.slots.pop(node.id)] = False
+
+        if self.size > 64 and 2 * len(self.slots) < self.size:
+            self.compact()
+
+    def update(self, node):
+        # The old entry stays in the heap, but it is no longer the latest one for the node
+        if self.heap is not None:
+            self.push(node)
+        self.values[self.slots[node.id]] = node.uct_value()
+
+    def update_reachability(self, node):
+        self.reachable[self.slots[node.id]] = not node.unreachable
+
+    def set_in_flight(self, node, in_flight):
+        self.in_flight[self.slots[node.id]] = in_flight
+
+    def is_in_flight(self, node):
+        return node.id in self.slots and self.in_flight.item(self.slots[node.id])
+
+    def push(self, node):
+        if len(self.heap) > 2 * len(self.nodes) + 64:  # Drops the stale entries, the new one included
+            self.rebuild()
+            return
+        entry = (-self.priority(node), self.orders[node.id], node.id)
+        self.entries[node.id] = entry
+        heapq.heappush(self.heap, entry)
+
+    def priority(self, node):
+        return node.uct_value() + self.novelty_factor * node.novelty_value
+
+    def rebuild(self):
+        self.entries = {
+            node_id: (-self.priority(node), self.orders[node_id], node_id) for node_id, node in self.nodes.items()
+        }
+        self.heap = list(self.entries.values())
+        heapq.heapify(self.heap)
+
+    def resize(self, capacity):
+        for name in ["node_ids", "values", "novelty", "reachable", "active", "in_flight"]:
+            array = getattr(self, name)
+            resized = np.zeros(capacity, dtype=array.dtype)
+            resized[: self.size] = array[: self.size]
+            setattr(self, name, resized)
+
+    def compact(self):
+        # Drops the removed slots while keeping the insertion order of the remaining ones
+        kept = np.flatnonzero(self.active[: self.size])
+        for name in ["node_ids", "values", "novelty", "reachable", "active", "in_flight"]:
+            array = getattr(self, name)
+            array[: len(kept)] = array[kept]
+            array[len(kept) : self.size] = 0
+        self.size = len(kept)
+        self.slots = {node_id: slot for slot, node_id in enumerate(self.node_ids[: self.size].tolist())}
+
+    def selectable_mask(self):
+        return self.active[: self.size] & self.reachable[: self.size] & ~self.in_flight[: self.size]
+
+    def count_selectable(self):
+        return int(np.count_nonzero(self.selectable_mask()))
+
+    def select(self, novelty_factor):
+
+        if self.heap is None or novelty_factor != self.novelty_factor:
+            self.novelty_factor = novelty_factor
+            self.rebuild()
+
+        best_node = None
+        skipped_entries = []
+        while self.heap:
+            entry = self.heap[0]
+            node_id = entry[2]
+            if self.entries.get(node_id) is not entry:  # Stale entry
+                heapq.heappop(self.heap)
+            elif self.nodes[node_id].unreachable or self.in_flight[self.slots[node_id]]:
+                # Might become selectable again, so put it back afterwards
+                skipped_entries.append(heapq.heappop(self.heap))
+            else:
+                best_node = self.nodes[node_id]
+                break
+
+        for entry in skipped_entries:
+            heapq.heappush(self.heap, entry)
+
+        return best_node
+
+    def select_vectorized(self, novelty_factor, noise=0):
+
+        # noise is either 0 or one sample per selectable node, in frontier order
+        mask = self.selectable_mask()
+        if not mask.any():
+            return None
+
+        scores = self.values[: self.size][mask] + noise + novelty_factor * self.novelty[: self.size][mask]
+        best_node_id = self.node_ids[: self.size][mask][np.argmax(scores)]
+        return self.nodes[best_node_id.item()]
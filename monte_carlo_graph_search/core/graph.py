@@ -1,8 +1,15 @@
+import pickle
+from collections import deque
+
 import matplotlib.pyplot as plt
 import networkx as nx
 import numpy as np
 from networkx.drawing.nx_agraph import graphviz_layout
 
+from monte_carlo_graph_search.core.best_node_index import BestNodeIndex
+from monte_carlo_graph_search.core.frontier import Frontier
+from monte_carlo_graph_search.core.shortest_path_tree import ShortestPathTree
+
 # Colors:
 # orange    -   standard
 # red       -   frontier
@@ -17,7 +24,12 @@ class Graph:
 
         self.graph = nx.DiGraph()
         self.config = config
-        self.frontier = []
+        self.frontier = Frontier()
+        self.best_nodes = BestNodeIndex()
+        self.paths = ShortestPathTree()
+        self.previous_paths = None
+        self.terminated_node_ids = []
+        self.observation_ids = {}
 
         self.use_novelty_for_best_step = config.novelty.use_novelty_for_best_step
         self.root_node = None
@@ -26,18 +38,28 @@ class Graph:
 
     def add_node(self, node):
 
-        if self.graph.has_node(node.observation) is False:
-            self.graph.add_node(node.observation, info=node)
-            if node.terminated is False:
-                self.add_to_frontier(node)
+        if node.observation not in self.observation_ids:
+            # Observations are interned into dense integer ids, so the graph never hashes the full observation again
+            node.id = len(self.observation_ids)
+            self.observation_ids[node.observation] = node.id
+            self.graph.add_node(node.id, info=node)
+            self.index_node(node)
             return True
         return False
 
+    def index_node(self, node):
+        self.best_nodes.invalidate(node)
+        if node.terminated:
+            self.terminated_node_ids.append(node.id)
+        elif node.terminated is False and node.is_leaf:
+            self.add_to_frontier(node)
+
     def add_edge(self, edge):
-        self.graph.add_edge(edge.node_from.observation, edge.node_to.observation, info=edge)
+        self.graph.add_edge(edge.node_from.id, edge.node_to.id, info=edge)
+        self.paths.add_edge(self, edge.node_from.id, edge.node_to.id)
 
     def add_to_frontier(self, node):
-        self.frontier.append(node)
+        self.frontier.add(node)
         self.new_nodes.append(node)
 
     def clear_new_nodes(self):
@@ -49,101 +71,195 @@ class Graph:
     def in_frontier(self, node):
         return node in self.frontier
 
+    def set_in_flight(self, node, in_flight):
+        if node in self.frontier:
+            self.frontier.set_in_flight(node, in_flight)
+
+    def is_in_flight(self, node):
+        return self.frontier.is_in_flight(node)
+
+    def count_selectable_frontier_nodes(self):
+        return self.frontier.count_selectable()
+
+    def update_node_value(self, node, value):
+        node.visits += 1
+        node.total_value += value
+        node.max_value = max(node.max_value, value)
+        if node in self.frontier:
+            self.frontier.update(node)
+        self.best_nodes.invalidate(node)
+
+    def set_unreachable(self, node, unreachable):
+        node.unreachable = unreachable
+        if node in self.frontier:
+            self.frontier.update_reachability(node)
+        self.best_nodes.invalidate(node)
+
+    def set_parent(self, node, parent, action):
+        node.set_parent(parent)
+        node.action = action
+        self.best_nodes.invalidate(node)
+
+    def clear(self):
+        self.graph = nx.DiGraph()
+        self.observation_ids = {}
+
     def save_graph(self, path):
-        nx.readwrite.write_gpickle(self.graph, path + ".gpickle")
+        # networkx 3 dropped write_gpickle, the file is still a pickled networkx graph
+        with open(path + ".gpickle", "wb") as graph_file:
+            pickle.dump(self.to_networkx(), graph_file)
 
     def load_graph(self, path):
-        self.graph = nx.readwrite.read_gpickle(path)
+        with open(path, "rb") as graph_file:
+            self.load_networkx(pickle.load(graph_file))
+
+    def load_networkx(self, graph):
+
+        # Nodes are added again in id order, so add_node gives them back their ids and rebuilds the observation ids,
+        # the frontier, the best nodes and the terminated nodes. The paths are rebuilt by set_root_node
+        node_ids = sorted(graph.nodes)
+        if node_ids != list(range(len(node_ids))):
+            raise ValueError("Only graphs with the dense node ids given by add_node can be loaded")
+
+        self.clear()
+        self.frontier = Frontier()
+        self.best_nodes = BestNodeIndex()
+        self.paths = ShortestPathTree()
+        self.previous_paths = None
+        self.terminated_node_ids = []
+        self.root_node = None
+        for node_id in node_ids:
+            self.add_node(graph.nodes[node_id]["info"])
+        for _, _, edge in graph.edges(data="info"):
+            self.add_edge(edge)
+        self.clear_new_nodes()
 
     def select_frontier_node(self, noisy, novelty_factor):
 
-        selectable_nodes = [x for x in self.frontier if x.unreachable is False]
-        if len(selectable_nodes) == 0:
-            return None
-        else:
-
-            if noisy:
-                amplitude = self.get_best_node(only_reachable=True).uct_value() * self.config.selection.amplitude_factor
-                noise = self.random.normal(
-                    0,
-                    max(amplitude, self.config.selection.noisy_min_value),
-                    len(selectable_nodes),
-                )
-            else:
-                noise = 0
+        if noisy:
+            selectable_nodes = self.frontier.count_selectable()
+            if selectable_nodes == 0:
+                return None
 
-            best_node = selectable_nodes[0]
-            best_node_value = best_node.uct_value() + noise[0] + novelty_factor * best_node.novelty_value
-            for i, n in enumerate(selectable_nodes):
-                if n.uct_value() + noise[i] + novelty_factor * n.novelty_value > best_node_value:
-                    best_node = n
-                    best_node_value = n.uct_value() + noise[i] + novelty_factor * n.novelty_value
+            amplitude = self.get_best_node(only_reachable=True).uct_value() * self.config.selection.amplitude_factor
+            noise = self.random.normal(
+                0,
+                max(amplitude, self.config.selection.noisy_min_value),
+                selectable_nodes,
+            )
+            best_node = self.frontier.select_vectorized(novelty_factor, noise)
+        else:
+            best_node = self.frontier.select(novelty_factor)
+            if best_node is None:
+                return None
 
-            assert self.has_path(self.root_node, best_node)
-            return best_node
+        assert self.has_path(self.root_node, best_node)
+        return best_node
 
     def set_root_node(self, root_node):
         self.root_node = root_node
+        if self.paths.root_id is not None:
+            self.previous_paths = self.paths
+        self.paths = ShortestPathTree()
+        self.paths.rebuild(self, root_node.id)
 
     def reroute_paths(self, root_node):
 
-        for node_id, node in self.graph.nodes.data("info"):
-            if root_node.observation != node_id:
+        for node in self.get_all_nodes_info():
+            if root_node.id != node.id:
                 if self.has_path(self.root_node, node):
                     self.reroute_path(self.root_node, node)
-                    node.unreachable = False
+                    self.set_unreachable(node, False)
                 else:
-                    node.unreachable = True
+                    self.set_unreachable(node, True)
 
     def reroute_path(self, node_from, node_to):
         nodes, actions = self.get_path(node_from, node_to)
         node_path = [self.get_node_info(x) for x in nodes]
         node_to.reroute(node_path, actions)
+        for node in node_path:
+            self.best_nodes.invalidate(node)
 
     def get_path(self, node_from, node_to):
 
-        observations = nx.dijkstra_path(self.graph, node_from.observation, node_to.observation)
+        node_ids = self.shortest_path(node_from.id, node_to.id)
+        if node_ids is None:
+            raise nx.NetworkXNoPath(f"Node {node_to.id} not reachable from {node_from.id}")
+
         actions = []
-        for i in range(len(observations) - 1):
-            actions.append(
-                self.get_edge_info(
-                    self.get_node_info(observations[i]),
-                    self.get_node_info(observations[i + 1]),
-                ).action
-            )
-        return observations, actions
+        for i in range(len(node_ids) - 1):
+            actions.append(self.get_edge_info_by_ids(node_ids[i], node_ids[i + 1]).action)
+        return node_ids, actions
 
     def get_path_length(self, node_from, node_to):
-        nodes = nx.dijkstra_path(self.graph, node_from.observation, node_to.observation)
-        return len(nodes)
+        node_ids, _ = self.get_path(node_from, node_to)
+        return len(node_ids)
 
     def has_path(self, node_from, node_to):
-        return nx.has_path(self.graph, node_from.observation, node_to.observation)
+        if node_from.id == self.paths.root_id:
+            return node_to.id in self.paths
+        return self.shortest_path(node_from.id, node_to.id) is not None
+
+    def shortest_path(self, source_id, target_id):
+
+        # Paths from the root come from the cached tree, other sources need a BFS of their own
+        if source_id == self.paths.root_id:
+            return self.paths.get_path(target_id)
+
+        parents = {source_id: None}
+        queue = deque([source_id])
+        while queue and target_id not in parents:
+            node_id = queue.popleft()
+            for child_id in self.get_successor_ids(node_id):
+                if child_id not in parents:
+                    parents[child_id] = node_id
+                    queue.append(child_id)
+
+        if target_id not in parents:
+            return None
+
+        node_ids = [target_id]
+        while parents[node_ids[-1]] is not None:
+            node_ids.append(parents[node_ids[-1]])
+        node_ids.reverse()
+        return node_ids
+
+    def get_node_id(self, observation):
+        return self.observation_ids.get(observation)
 
-    def get_node_info(self, observation):
-        return self.graph.nodes[observation]["info"]
+    def get_node_info(self, node_id):
+        return self.graph.nodes[node_id]["info"]
+
+    def get_node_by_observation(self, observation):
+        return self.get_node_info(self.observation_ids[observation])
 
     def get_all_nodes_info(self):
         return list(nx.get_node_attributes(self.graph, "info").values())
 
     def get_nodes_with_degree(self, degree):
         node_list = []
-        for node, out_degree in self.graph.out_degree():
-            if self.get_node_from_observation(node).is_terminal:  # Poor optimization here for large graph
+        for node in self.get_all_nodes_info():
+            if node.terminated:  # Poor optimization here for large graph
                 continue
-            if out_degree == degree or (out_degree == degree + 1 and self.graph.has_edge(node, node)):
-                node_list.append(self.graph.nodes[node]["info"])
+            successor_ids = self.get_successor_ids(node.id)
+            out_degree = len(successor_ids)
+            if out_degree == degree or (out_degree == degree + 1 and node.id in successor_ids):
+                node_list.append(node)
         return node_list
 
-    def get_best_node(self, only_reachable):
+    def get_best_node_value(self, node):
+        value = node.get_value() + self.get_edge_info(node.parent, node).reward
+        if self.use_novelty_for_best_step:
+            value += node.novelty_value
+        return value
 
-        nodes = self.get_all_nodes_info()
-        nodes.remove(self.root_node)
+    def get_best_node(self, only_reachable):
 
         if only_reachable:
-            selectable_nodes = [x for x in nodes if x.unreachable is False]
-        else:
-            selectable_nodes = nodes
+            return self.best_nodes.select(self, self.root_node)
+
+        selectable_nodes = self.get_all_nodes_info()
+        selectable_nodes.remove(self.root_node)
 
         if len(selectable_nodes) > 0:
             best_node = selectable_nodes[0]
@@ -166,48 +282,45 @@ class Graph:
 
     def get_closest_done_node(self, only_reachable):
 
-        selectable_nodes = [x for x in self.get_all_nodes_info() if x.terminated]
-        if only_reachable:
-            selectable_nodes = [x for x in selectable_nodes if x.unreachable is False]
+        # Distances come from the shortest path tree, so there is no search per terminated node
+        best_node = None
+        best_node_length = None
+        for node_id in self.terminated_node_ids:
+            node_length = self.paths.get_distance(node_id)
+            if node_length is None:
+                continue
 
-        if len(selectable_nodes) > 0:
-            best_node = selectable_nodes[0]
-            best_node_length = self.get_path_length(self.root_node, best_node)
-        else:
-            best_node = None
-            best_node_length = None
+            node = self.get_node_info(node_id)
+            if only_reachable and node.unreachable:
+                continue
 
-        for n in selectable_nodes:
-            selected_node_length = self.get_path_length(self.root_node, n)
-            if selected_node_length < best_node_length:
-                best_node = n
-                best_node_length = selected_node_length
+            if best_node_length is None or node_length < best_node_length:
+                best_node = node
+                best_node_length = node_length
 
         return best_node
 
     def has_node(self, observation):
-        return self.graph.has_node(observation)
+        return observation in self.observation_ids
 
     def has_edge(self, edge):
         parent = edge.node_from
         child = edge.node_to
-        return self.graph.has_edge(parent.observation, child.observation)
+        return self.has_edge_by_ids(parent.id, child.id)
 
-    def has_edge_by_observations(self, observation_from, observation_to):
-        return self.graph.has_edge(observation_from, observation_to)
+    def has_edge_by_ids(self, node_from_id, node_to_id):
+        return self.graph.has_edge(node_from_id, node_to_id)
 
-    def get_children(self, node):
-        node_list = []
-        for n in self.graph.successors(node.observation):
-            child_node = self.graph.nodes[n]["info"]
-            node_list.append(child_node)
+    def get_successor_ids(self, node_id):
+        return list(self.graph.successors(node_id))
 
-        return node_list
+    def get_children(self, node):
+        return self.get_children_with_id(node.id)
 
     def get_children_with_id(self, node_id):
         node_list = []
-        for n in self.graph.successors(node_id):
-            node_list.append(self.graph.nodes[n]["info"])
+        for n in self.get_successor_ids(node_id):
+            node_list.append(self.get_node_info(n))
         return node_list
 
     def get_child_with_action(self, identifier, action):
@@ -219,8 +332,17 @@ class Graph:
     def get_number_of_nodes(self):
         return len(self.graph.nodes)
 
+    def get_number_of_edges(self):
+        return len(self.graph.edges)
+
     def get_edge_info(self, parent, child):
-        return self.graph.get_edge_data(parent.observation, child.observation)["info"]
+        return self.get_edge_info_by_ids(parent.id, child.id)
+
+    def get_edge_info_by_ids(self, node_from_id, node_to_id):
+        return self.graph.get_edge_data(node_from_id, node_to_id)["info"]
+
+    def to_networkx(self):
+        return self.graph
 
     def get_unreachable_nodes(self):
         i = 0
@@ -232,8 +354,8 @@ class Graph:
     def get_metrics(self):
 
         metrics = {
-            "total_nodes": len(self.graph.nodes),
-            "total_edges": len(self.graph.edges),
+            "total_nodes": self.get_number_of_nodes(),
+            "total_edges": self.get_number_of_edges(),
             "total_frontier_nodes": len(self.frontier),
             "total_unreachable_nodes": self.get_unreachable_nodes(),
             "new_nodes": len(self.new_nodes),
@@ -243,7 +365,8 @@ class Graph:
 
     def draw_graph(self):
 
-        nodes_info = nx.get_node_attributes(self.graph, "info")
+        graph = self.to_networkx()
+        nodes_info = nx.get_node_attributes(graph, "info")
         node_color_map = []
         node_size_map = []
         value_map = {}
@@ -251,10 +374,10 @@ class Graph:
         for node in nodes_info.values():
 
             if (node.novelty_value == 0 and node.get_value() == 0) or node not in self.frontier:
-                value_map[node.observation] = ""
+                value_map[node.id] = ""
             else:
-                # value_map[node.observation] = str(round(node.novelty_value + node.get_value(), 2))
-                value_map[node.observation] = ""
+                # value_map[node.id] = str(round(node.novelty_value + node.get_value(), 2))
+                value_map[node.id] = ""
             node_size_map.append(30)
 
             if node == self.root_node:
@@ -272,7 +395,7 @@ class Graph:
             else:
                 node_color_map.append("orange")
 
-        edges_info = nx.get_edge_attributes(self.graph, "info")
+        edges_info = nx.get_edge_attributes(graph, "info")
         edge_color_map = []
         edge_width_map = []
         for edge in edges_info.values():
@@ -302,7 +425,7 @@ class Graph:
             "arrowsize": 10,
         }
 
-        pos = graphviz_layout(self.graph, prog="neato")
+        pos = graphviz_layout(graph, prog="neato")
 
         options = {}
         options.update(general_options)
@@ -312,34 +435,45 @@ class Graph:
         dpi = 96
         plt.figure(1, figsize=(1024 / dpi, 768 / dpi))
 
-        nx.draw(self.graph, pos, **options)
-        nx.draw_networkx_labels(self.graph, pos, value_map, font_size=8)
+        nx.draw(graph, pos, **options)
+        nx.draw_networkx_labels(graph, pos, value_map, font_size=8)
         plt.show()
 
     def reroute_all(self):
 
-        all_nodes = self.get_all_nodes_info()
-        for n in all_nodes:
-            n.unreachable = True
-            n.parent = -1
-        self.root_node.parent = None
-
-        # BFS implementation
-        visited = []
-        queue = []
-        root_node_id = self.root_node.observation
-        visited.append(root_node_id)
-        queue.append(root_node_id)
-
-        while queue:
-            node_id = queue.pop(0)
-            node = self.get_node_info(node_id)
-            for child in self.graph.successors(node_id):
-                # Set all of the new routes
-                if child not in visited:
-                    child_node = self.get_node_info(child)
-                    child_node.unreachable = False
-                    child_node.set_parent(node)
-                    child_node.action = self.get_edge_info(node, child_node).action
-                    visited.append(child)
-                    queue.append(child)
+        # Full rebuild: every node takes its parent and reachability from the shortest path tree of the root
+        for node in self.get_all_nodes_info():
+            self.reroute_node(node)
+        self.previous_paths = None
+
+    def reroute_changed(self):
+
+        # Nodes that were unreachable from the previous root, and are unreachable from the new one, are already
+        # marked as such, so only the nodes of the previous and the current tree need to be checked
+        if self.previous_paths is None or self.root_node.id not in self.previous_paths:
+            self.reroute_all()
+            return
+
+        for node_id in self.paths.distances:
+            self.reroute_node(self.get_node_info(node_id))
+        for node_id in self.previous_paths.distances:
+            if node_id not in self.paths:
+                self.reroute_node(self.get_node_info(node_id))
+        self.previous_paths = None
+
+    def reroute_node(self, node):
+
+        # The root is left marked as unreachable, so it is never selected from the frontier
+        parent_id = self.paths.parents.get(node.id)
+        unreachable = parent_id is None
+        if node.unreachable != unreachable:
+            self.set_unreachable(node, unreachable)
+
+        if parent_id is None:
+            if node.parent is not None:
+                self.set_parent(node, None, node.action)
+        else:
+            action = self.get_edge_info_by_ids(parent_id, node.id).action
+            parent = node.parent
+            if parent is None or parent.id != parent_id or node.action != action:
+                self.set_parent(node, self.get_node_info(parent_id), action)
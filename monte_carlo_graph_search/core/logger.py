@@ -49,3 +49,20 @@ class NeptuneLogger:
 
     def get_id(self):
         return self.run["sys/id"].fetch()
+
+
+class MemoryLogger:
+    """
+    Keeps the written metrics in memory, for agents that don't log to neptune themselves (ensemble workers)
+    """
+
+    def __init__(self):
+        self.metrics = []
+
+    def write(self, data, timestep):
+        self.metrics.append((timestep, data))
+
+    def pop_metrics(self):
+        metrics = self.metrics
+        self.metrics = []
+        return metrics
@@ -3,6 +3,7 @@ class Node:
         self, observation, parent, is_leaf, action, value, terminated, truncated, visits, novelty_value, config
     ):
 
+        self.id = None  # Assigned by the graph when the node is added
         self.observation = observation
         self.parent = parent
         self.is_leaf = is_leaf
@@ -62,4 +63,4 @@ class Node:
         self.parent = parent
 
     def __hash__(self):
-        return hash(self.observation)
+        return hash(self.id)
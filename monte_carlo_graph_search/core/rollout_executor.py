@@ -0,0 +1,71 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+worker_env = None  # Warm environment of a worker process, created once by init_worker
+
+
+def init_worker(env_class, env_config):
+    global worker_env
+    worker_env = env_class(env_config)
+
+
+def run_worker_rollouts(start_state, actions, action_failure_probabilities):
+    worker_env.set_state(start_state)
+    return run_rollouts(worker_env, actions, action_failure_probabilities)
+
+
+def run_rollouts(env, actions, action_failure_probabilities):
+
+    # Same steps as MCGSAgent.rollout, with one row of pre-drawn actions and failure probabilities per rollout
+    results = []
+    for row in range(len(actions)):
+        rollout_env = env.copy()
+        previous_observation = rollout_env.get_observation()
+
+        path = []
+        cumulative_reward = 0
+        for idx in range(actions.shape[1]):
+            action = actions.item(row, idx)
+            state, reward, terminated, truncated, info = rollout_env.stochastic_step(
+                action, action_failure_probabilities[row, idx]
+            )
+            observation = rollout_env.get_observation()
+            cumulative_reward += reward
+            path.append((previous_observation, observation, action, reward, terminated, truncated))
+            previous_observation = observation
+            if terminated or truncated:
+                break
+
+        results.append((cumulative_reward, path))
+    return results
+
+
+class RolloutExecutor:
+    """
+    Runs rollouts in a pool of worker processes that keep a warm environment each.
+    Workers only receive the start state and the pre-drawn actions and failure probabilities of their rollouts,
+    and results are returned in the order of the rollouts, so they don't depend on the number of workers.
+    The environment needs get_state and set_state, and has to be constructible from its config.
+    """
+
+    def __init__(self, env, num_workers):
+        self.num_workers = num_workers
+        self.pool = ProcessPoolExecutor(num_workers, initializer=init_worker, initargs=(type(env), env.config))
+
+    def run(self, env, actions, action_failure_probabilities):
+
+        start_state = env.get_state()
+        chunks = [chunk for chunk in np.array_split(np.arange(len(actions)), self.num_workers) if len(chunk) > 0]
+        futures = [
+            self.pool.submit(run_worker_rollouts, start_state, actions[chunk], action_failure_probabilities[chunk])
+            for chunk in chunks
+        ]
+        results = [result for future in futures for result in future.result()]
+
+        # Forward model calls of the workers are not seen by the main process
+        type(env).forward_model_calls += sum(len(path) for _, path in results)
+        return results
+
+    def shutdown(self):
+        self.pool.shutdown()
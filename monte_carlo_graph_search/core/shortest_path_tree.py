@@ -0,0 +1,57 @@
+from collections import deque
+
+
+class ShortestPathTree:
+    """
+    BFS tree of shortest paths from the root node. It is rebuilt once when the root changes, and then kept
+    up to date as edges are added: edges are never removed, so distances can only decrease and only the
+    nodes whose distance decreased are relaxed. Paths from the root are read from the parent pointers.
+    """
+
+    def __init__(self):
+        self.root_id = None
+        self.distances = {}  # node id -> distance from the root
+        self.parents = {}  # node id -> parent node id in the tree
+
+    def __contains__(self, node_id):
+        return node_id in self.distances
+
+    def rebuild(self, graph, root_id):
+        self.root_id = root_id
+        self.distances = {root_id: 0}
+        self.parents = {root_id: None}
+        self.relax(graph, deque([root_id]))
+
+    def add_edge(self, graph, node_from_id, node_to_id):
+        if node_from_id not in self.distances:
+            return
+
+        distance = self.distances[node_from_id] + 1
+        if distance < self.distances.get(node_to_id, distance + 1):
+            self.distances[node_to_id] = distance
+            self.parents[node_to_id] = node_from_id
+            self.relax(graph, deque([node_to_id]))
+
+    def relax(self, graph, queue):
+        # Successors are visited in insertion order, so a full rebuild finds the same paths as dijkstra
+        while queue:
+            node_id = queue.popleft()
+            distance = self.distances[node_id] + 1
+            for child_id in graph.get_successor_ids(node_id):
+                if distance < self.distances.get(child_id, distance + 1):
+                    self.distances[child_id] = distance
+                    self.parents[child_id] = node_id
+                    queue.append(child_id)
+
+    def get_distance(self, node_id):
+        return self.distances.get(node_id)
+
+    def get_path(self, node_id):
+        if node_id not in self.distances:
+            return None
+
+        node_ids = [node_id]
+        while self.parents[node_ids[-1]] is not None:
+            node_ids.append(self.parents[node_ids[-1]])
+        node_ids.reverse()
+        return node_ids
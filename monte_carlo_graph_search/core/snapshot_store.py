@@ -0,0 +1,35 @@
+from collections import OrderedDict
+
+
+class SnapshotStore:
+    """
+    Bounded store of environment snapshots taken at graph nodes, with least recently used eviction.
+    A snapshot lets the selection restore the environment at a node instead of replaying the path from the root.
+    """
+
+    def __init__(self, max_snapshots):
+        self.max_snapshots = max_snapshots
+        self.snapshots = OrderedDict()  # node id -> (environment, depth), from least to most recently used
+
+    def __len__(self):
+        return len(self.snapshots)
+
+    def __contains__(self, node_id):
+        return node_id in self.snapshots
+
+    def add(self, node_id, env, depth):
+        self.snapshots[node_id] = (env, depth)
+        self.snapshots.move_to_end(node_id)
+        if len(self.snapshots) > self.max_snapshots:
+            self.snapshots.popitem(last=False)
+
+    def get(self, node_id, depth):
+        # A snapshot taken at a different distance from the root has a different step count than a replay would
+        snapshot = self.snapshots.get(node_id)
+        if snapshot is None or snapshot[1] != depth:
+            return None
+        self.snapshots.move_to_end(node_id)
+        return snapshot[0]
+
+    def clear(self):
+        self.snapshots.clear()
@@ -0,0 +1,35 @@
+class TransitionCache:
+    """
+    Transitions seen in a deterministic environment, (node id, action) -> (next node id, reward, terminated, truncated),
+    so that the search can follow known transitions without stepping the environment.
+    The step counter of the environment is not part of the key, so truncated transitions are never cached, and
+    rewards that depend on the step counter (reaching the goal) are the ones of the first time the transition was seen.
+    """
+
+    def __init__(self):
+        self.transitions = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.transitions)
+
+    def add(self, node_id, action, next_node_id, reward, terminated, truncated):
+        if truncated:
+            return
+        self.transitions[(node_id, action)] = (next_node_id, reward, terminated, truncated)
+
+    def get(self, node_id, action):
+        transition = self.transitions.get((node_id, action))
+        if transition is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return transition
+
+    def get_metrics(self):
+        # Hits and misses are counted per move
+        metrics = {"transition_cache_hits": self.hits, "transition_cache_misses": self.misses}
+        self.hits = 0
+        self.misses = 0
+        return metrics
@@ -0,0 +1,82 @@
+import numpy as np
+
+from monte_carlo_graph_search.environment.griddly.clusters_observation import (
+    ClustersObservation,
+    encode_layer_batch,
+)
+
+
+class BatchClustersEnv:
+    """
+    Batch of Clusters games with the interface of BatchMinigridEnv, every row is a clone of the Griddly game of a
+    ClustersEnv. Griddly can't step several games in one call, so the rows are stepped one after the other, but
+    directly through the Griddly player instead of the gym wrapper, and the observations of all the rows are
+    encoded together. Rewards and done flags are the same as the ones of ClustersEnv.step.
+    """
+
+    def __init__(self, env, batch_size):
+
+        self.env_class = type(env)  # Forward model calls are counted on the environment class
+        self.config = env.config
+        self.is_stochastic = env.is_stochastic
+        self.action_space = env.action_space
+        self.batch_size = batch_size
+
+        self.games = [None] * batch_size
+        self.players = [None] * batch_size
+        self.layers = np.zeros((batch_size,) + env.state.shape, dtype=env.state.dtype)
+        self.grids = encode_layer_batch(self.layers)
+        self.terminated = np.zeros(batch_size, dtype=np.bool_)
+        self.truncated = np.zeros(batch_size, dtype=np.bool_)
+
+    def load(self, index, env):
+        self.set_game(index, env.env.clone())
+        self.layers[index] = env.state
+        self.grids[index] = encode_layer_batch(self.layers[index : index + 1])[0]
+        self.terminated[index] = bool(env.terminated)
+        self.truncated[index] = bool(env.truncated)
+
+    def load_all(self, envs):
+        for index, env in enumerate(envs):
+            self.load(index, env)
+
+    def copy_row(self, index_from, index_to):
+        self.set_game(index_to, self.games[index_from].clone())
+        for array in [self.layers, self.grids, self.terminated, self.truncated]:
+            array[index_to] = array[index_from]
+
+    def set_game(self, index, game):
+        game.unwrapped.level = 0  # TODO: Fix directly in Griddly
+        self.games[index] = game
+        self.players[index] = game._players[0]  # Clusters has a single player
+
+    def step(self, actions, active=None):
+
+        # actions has one action per row, rows that are not active are left unchanged
+        rows = np.arange(self.batch_size) if active is None else np.flatnonzero(active)
+        rewards = np.zeros(self.batch_size, dtype=np.float64)
+        done = np.zeros(self.batch_size, dtype=np.bool_)
+
+        for row in rows.tolist():
+            player = self.players[row]
+            rewards[row], done[row], _ = player.step_multi(np.array([[actions[row]]], dtype=np.int32), True)
+            self.layers[row] = np.array(player.observe(), copy=False)
+        self.grids[rows] = encode_layer_batch(self.layers[rows])
+
+        # Same as ClustersEnv.step, games that end without losing are truncated, and truncated games get no reward
+        self.terminated[rows] = done[rows] & (rewards[rows] == -1)
+        self.truncated[rows] = done[rows] & (rewards[rows] != -1)
+        rewards[self.truncated & done] = 0
+
+        self.env_class.forward_model_calls += len(rows)
+        return rewards, self.terminated.copy(), self.truncated.copy()
+
+    def stochastic_step(self, actions, action_failure_probs, active=None):
+
+        if self.is_stochastic:  # If the env is stochastic, failed actions are swapped for no action
+            actions = np.where(action_failure_probs < self.config.action_failure_probability, 6, actions)
+        return self.step(actions, active)
+
+    def get_observation(self, index):
+        grid = self.grids[index]
+        return ClustersObservation(grid.tobytes(), grid.shape, grid.dtype.type)
@@ -2,9 +2,15 @@ import copy
 from os import getcwd
 
 import gym
-import numpy as np
 from griddly import GymWrapperFactory, gd
 
+from monte_carlo_graph_search.environment.griddly.batch_clusters_env import (
+    BatchClustersEnv,
+)
+from monte_carlo_graph_search.environment.griddly.clusters_observation import (
+    encode_layers,
+)
+
 
 class ClustersEnv:
     """
@@ -51,6 +57,8 @@ class ClustersEnv:
 
         self.current_step = 0
 
+        self.undo_stack = []
+
         self.reset()
 
     def step(self, action):
@@ -74,6 +82,22 @@ class ClustersEnv:
         ClustersEnv.forward_model_calls += 1
         return observation, self.reward, self.terminated, self.truncated, self.info
 
+    def step_with_undo(self, action):
+
+        # The Griddly state is saved before the step, and loaded again by undo(). The last observation is copied,
+        # since the wrapper overwrites it in place on the next step
+        last_step = (self.action, copy.deepcopy(self.state), self.reward, self.terminated, self.truncated, self.info)
+        self.undo_stack.append((self.env.get_state(), last_step, self.current_step))
+        return self.step(action)
+
+    def undo(self):
+
+        # Reverts the last step_with_undo
+        game_state, last_step, self.current_step = self.undo_stack.pop()
+        self.env = self.env.load_state(game_state)
+        self.env.unwrapped.level = 0  # TODO: Fix directly in Griddly
+        self.action, self.state, self.reward, self.terminated, self.truncated, self.info = last_step
+
     def stochastic_step(self, action, action_failure_prob=None):
 
         self.action = action  # Save the original action
@@ -110,25 +134,34 @@ class ClustersEnv:
         return self.get_observation()
 
     def get_observation(self):
-
-        layers = self.state
-        grid = np.zeros(shape=layers[0].shape, dtype=np.float32)
-        for idx, layer in enumerate(layers):
-            grid = np.add(grid, layer * (idx + 1))
-
-        return str(grid.T)
+        return encode_layers(self.state)
 
     def copy(self):
-        env = self.env.clone()
-        x = ClustersEnv(self.config)
-        x.env = env
+        # Only the Griddly game is cloned, building a new ClustersEnv would make and reset a Griddly env for nothing
+        x = copy.copy(self)
+        x.env = self.env.clone()
         x.env.unwrapped.level = 0  # TODO: Fix directly in Griddly
-        x.action = copy.deepcopy(self.action)
         x.state = copy.deepcopy(self.state)
-        x.reward = copy.deepcopy(self.reward)
-        x.terminated = copy.deepcopy(self.terminated)
-        x.truncated = copy.deepcopy(self.truncated)
         x.info = copy.deepcopy(self.info)
-        x.current_step = copy.deepcopy(self.current_step)
+        x.undo_stack = []
 
         return x
+
+    def get_state(self):
+        # The Griddly game state is a plain dict, so it can be sent to the rollout workers. The last observation is
+        # copied, as in step_with_undo
+        last_step = (self.action, copy.deepcopy(self.state), self.reward, self.terminated, self.truncated, self.info)
+        return {"game_state": self.env.get_state(), "current_step": self.current_step, "last_step": last_step}
+
+    def set_state(self, state):
+        # The last observation is copied again, so that the same state can be restored more than once
+        self.env = self.env.load_state(state["game_state"])
+        self.env.unwrapped.level = 0  # TODO: Fix directly in Griddly
+        self.current_step = state["current_step"]
+        self.action, self.state, self.reward, self.terminated, self.truncated, self.info = state["last_step"]
+        self.state = copy.deepcopy(self.state)
+        self.info = copy.deepcopy(self.info)
+        self.undo_stack = []
+
+    def make_batch(self, batch_size):
+        return BatchClustersEnv(self, batch_size)
@@ -2,9 +2,12 @@ import copy
 from os import getcwd
 
 import gym
-import numpy as np
 from griddly import GymWrapperFactory, gd
 
+from monte_carlo_graph_search.environment.griddly.clusters_observation import (
+    encode_layers,
+)
+
 
 class ClustersEnv:
     """
@@ -48,6 +51,8 @@ class ClustersEnv:
         self.truncated = None
         self.info = None
 
+        self.undo_stack = []
+
         self.reset()
 
     def step(self, action):
@@ -68,6 +73,22 @@ class ClustersEnv:
 
         return observation, self.reward, self.terminated, self.truncated, self.info
 
+    def step_with_undo(self, action):
+
+        # The Griddly state is saved before the step, and loaded again by undo(). The last observation is copied,
+        # since the wrapper overwrites it in place on the next step
+        last_step = (self.action, copy.deepcopy(self.state), self.reward, self.terminated, self.truncated, self.info)
+        self.undo_stack.append((self.env.get_state(), last_step))
+        return self.step(action)
+
+    def undo(self):
+
+        # Reverts the last step_with_undo
+        game_state, last_step = self.undo_stack.pop()
+        self.env = self.env.load_state(game_state)
+        self.env.unwrapped.level = 0  # TODO: Fix directly in Griddly
+        self.action, self.state, self.reward, self.terminated, self.truncated, self.info = last_step
+
     def stochastic_step(self, action, action_failure_prob=None):
 
         self.action = action  # Save the original action
@@ -104,24 +125,15 @@ class ClustersEnv:
         return self.get_observation()
 
     def get_observation(self):
-
-        layers = self.state
-        grid = np.zeros(shape=layers[0].shape, dtype=np.float32)
-        for idx, layer in enumerate(layers):
-            grid = np.add(grid, layer * (idx + 1))
-
-        return str(grid.T)
+        return encode_layers(self.state)
 
     def copy(self):
-        env = self.env.clone()
-        x = ClustersEnv(self.config)
-        x.env = env
+        # Only the Griddly game is cloned, building a new ClustersEnv would make and reset a Griddly env for nothing
+        x = copy.copy(self)
+        x.env = self.env.clone()
         x.env.unwrapped.level = 0  # TODO: Fix directly in Griddly
-        x.action = copy.deepcopy(self.action)
         x.state = copy.deepcopy(self.state)
-        x.reward = copy.deepcopy(self.reward)
         x.info = copy.deepcopy(self.info)
-        x.terminated = copy.deepcopy(self.terminated)
-        x.truncated = copy.deepcopy(self.truncated)
+        x.undo_stack = []
 
         return x
@@ -0,0 +1,57 @@
+import numpy as np
+
+
+def get_layer_weights(number_of_layers):
+    # Index of every layer, and the smallest type that holds the sum of all of them
+    dtype = np.uint8 if number_of_layers * (number_of_layers + 1) // 2 <= np.iinfo(np.uint8).max else np.uint16
+    return np.arange(1, number_of_layers + 1, dtype=np.uint16), dtype
+
+
+def encode_layers(layers):
+
+    # Every cell of the map has the sum of the (1-based) indices of the layers with an object in that cell
+    weights, dtype = get_layer_weights(len(layers))
+    grid = np.tensordot(weights, layers, axes=1).T.astype(dtype)
+    return ClustersObservation(grid.tobytes(), grid.shape, dtype)
+
+
+def encode_layer_batch(layers):
+    # Same maps as encode_layers for a batch of layers, as an array of shape (batch, width, height)
+    weights, dtype = get_layer_weights(layers.shape[1])
+    return np.tensordot(layers, weights, axes=([1], [0])).transpose(0, 2, 1).astype(dtype)
+
+
+class ClustersObservation:
+    """
+    Observation of a Clusters state, the layer-index map of the grid packed into bytes, with its hash computed once.
+    str() gives the map as text, the same as the observation string used to be, for debugging.
+    """
+
+    __slots__ = ("grid", "shape", "dtype", "hash")
+
+    def __init__(self, grid, shape, dtype):
+        self.grid = grid
+        self.shape = shape
+        self.dtype = dtype
+        self.hash = hash(grid)
+
+    def __hash__(self):
+        return self.hash
+
+    def __eq__(self, other):
+        if not isinstance(other, ClustersObservation):
+            return NotImplemented
+        return self.hash == other.hash and self.grid == other.grid and self.shape == other.shape
+
+    def __reduce__(self):
+        # The hash of bytes is different in every process, so it is computed again when unpickled
+        return ClustersObservation, (self.grid, self.shape, self.dtype)
+
+    def __str__(self):
+        return str(self.to_array().astype(np.float32))
+
+    def __repr__(self):
+        return str(self)
+
+    def to_array(self):
+        return np.frombuffer(self.grid, dtype=self.dtype).reshape(self.shape)
@@ -0,0 +1,370 @@
+import copy
+import os
+
+import numpy as np
+import yaml
+from gym.spaces import Discrete
+
+from monte_carlo_graph_search.environment.griddly.clusters_observation import (
+    ClustersObservation,
+)
+
+YAML_PATH = os.path.join(os.path.dirname(__file__), "clusters.yaml")
+MAX_STEPS = 200  # Same as ClustersEnv
+TILE_SIZE = 16
+
+EMPTY = 0
+NO_ACTION = 0
+# Action -> (dx, dy), same as the default Griddly move action
+ACTION_TO_DX = np.array([0, -1, 0, 1, 0])
+ACTION_TO_DY = np.array([0, 0, -1, 0, 1])
+
+levels = {}  # level id -> ClustersLevel
+
+
+def load_level(level_id):
+    level = levels.get(level_id)
+    if level is None:
+        with open(YAML_PATH) as yaml_file:
+            level = ClustersLevel(yaml.safe_load(yaml_file), level_id)
+        levels[level_id] = level
+    return level
+
+
+class ClustersLevel:
+    """
+    Objects and initial grid of a level of clusters.yaml. Objects have the id of their layer in the Griddly vector
+    observation, which sorts them by name, plus one, so that a grid of object ids is also the observation map.
+    """
+
+    def __init__(self, gdy, level_id):
+
+        objects = gdy["Objects"]
+        self.object_names = sorted(obj["Name"] for obj in objects)
+        self.ids = {name: idx + 1 for idx, name in enumerate(self.object_names)}
+        self.avatar = self.ids["avatar"]
+        self.wall = self.ids["wall"]
+        self.spike = self.ids["spike"]
+        self.broken_box = self.ids["broken_box"]
+
+        # Box id -> id of the block it changes to when pushed against it, 0 for other objects
+        self.box_to_block = np.zeros(len(self.object_names) + 1, dtype=np.uint8)
+        for name in self.object_names:
+            if name.endswith("_box") and name != "broken_box":
+                self.box_to_block[self.ids[name]] = self.ids[name.replace("_box", "_block")]
+
+        characters = {obj["MapCharacter"]: self.ids[obj["Name"]] for obj in objects if "MapCharacter" in obj}
+        rows = [row.split() for row in gdy["Environment"]["Levels"][level_id].strip().split("\n")]
+        self.grid = np.array([[characters.get(character, EMPTY) for character in row] for row in rows], dtype=np.uint8)
+
+        self.colors = np.zeros((len(self.object_names) + 1, 3), dtype=np.uint8)
+        for obj in objects:
+            color = obj.get("Observers", {}).get("Block2D", [{}])[0].get("Color", [0.0, 0.0, 0.0])
+            self.colors[self.ids[obj["Name"]]] = np.array(color) * 255
+
+
+class NumpyClustersEnv:
+    """
+    NumPy implementation of the Clusters rules of clusters.yaml, with the interface of ClustersEnv and without
+    Griddly. The avatar moves into empty cells and pushes boxes, a box pushed against a block of its colour changes
+    into that block (reward 1), a box pushed against a spike breaks (reward -1), and the avatar dies on a spike
+    (reward -1). Every cell holds at most one object, so the state is a grid of object ids.
+    Rewards, terminated and truncated are the same as the ones of ClustersEnv.step, and the observation is empty
+    once the avatar is removed, the same as the Griddly player observation.
+    """
+
+    forward_model_calls = 0
+
+    def __init__(self, config):
+
+        self.config = config
+        self.level = load_level(0)
+        self.action_space = Discrete(len(ACTION_TO_DX))
+        self.is_stochastic = False
+        self.max_steps = MAX_STEPS
+
+        self.grid = None
+        self.avatar_x = None
+        self.avatar_y = None
+        self.avatar_alive = None
+        self.box_broken = None
+        self.box_count = None
+
+        self.action = None
+        self.state = None
+        self.reward = None
+        self.terminated = None
+        self.truncated = None
+        self.info = None
+
+        self.current_step = 0
+
+        self.undo_stack = []
+
+        self.reset()
+
+    def step(self, action):
+
+        self.action = action  # Save the original action
+        level = self.level
+        grid = self.grid
+        reward = 0
+
+        dx = ACTION_TO_DX[action]
+        dy = ACTION_TO_DY[action]
+        if action != NO_ACTION and self.avatar_alive:
+            front_x = self.avatar_x + dx
+            front_y = self.avatar_y + dy
+            front = grid[front_y, front_x]
+            move = front == EMPTY
+            if front == level.spike:
+                grid[self.avatar_y, self.avatar_x] = EMPTY
+                self.avatar_alive = False
+                reward -= 1
+            elif level.box_to_block[front] != EMPTY:
+                # The box is pushed in the same direction
+                behind = grid[front_y + dy, front_x + dx]
+                if behind == EMPTY:
+                    grid[front_y + dy, front_x + dx] = front
+                    grid[front_y, front_x] = EMPTY
+                    move = True
+                elif behind == level.box_to_block[front]:
+                    grid[front_y, front_x] = behind
+                    self.box_count -= 1
+                    reward += 1
+                elif behind == level.spike:
+                    grid[front_y, front_x] = level.broken_box
+                    self.box_broken = True
+                    reward -= 1
+            if move:
+                grid[self.avatar_y, self.avatar_x] = EMPTY
+                grid[front_y, front_x] = level.avatar
+                self.avatar_x = front_x
+                self.avatar_y = front_y
+
+        self.current_step += 1
+        done = self.box_count == 0 or self.box_broken or not self.avatar_alive or self.current_step > self.max_steps
+
+        # Same as ClustersEnv.step, games that end without losing are truncated, and truncated games get no reward
+        self.terminated = done and reward == -1
+        self.truncated = done and reward != -1
+        self.reward = 0 if self.truncated else reward
+        self.info = {}
+        self.state = self.grid
+
+        if not self.avatar_alive:  # The Griddly player observes an empty grid once its avatar is removed
+            self.grid = np.zeros_like(self.grid)
+            self.state = self.grid
+
+        NumpyClustersEnv.forward_model_calls += 1
+        return self.get_observation(), self.reward, self.terminated, self.truncated, self.info
+
+    def stochastic_step(self, action, action_failure_prob=None):
+
+        self.action = action  # Save the original action
+        if self.is_stochastic:  # If the env is stochastic check if action should fail
+            if action_failure_prob < self.config.action_failure_probability:  # If the action should fail, swap it here
+                action = NO_ACTION
+
+        return self.step(action)
+
+    def step_with_undo(self, action):
+        self.undo_stack.append(self.get_state())
+        return self.step(action)
+
+    def undo(self):
+        # Reverts the last step_with_undo
+        undo_stack = self.undo_stack
+        self.set_state(undo_stack.pop())
+        self.undo_stack = undo_stack
+
+    def reset(self):
+
+        self.grid = self.level.grid.copy()
+        avatar_y, avatar_x = np.argwhere(self.grid == self.level.avatar)[0]
+        self.avatar_x = int(avatar_x)
+        self.avatar_y = int(avatar_y)
+        self.avatar_alive = True
+        self.box_broken = False
+        self.box_count = int(np.count_nonzero(self.level.box_to_block[self.grid]))
+
+        self.current_step = 0
+        self.action = None
+        self.state = self.grid
+        self.reward = None
+        self.terminated = None
+        self.truncated = None
+        self.info = None
+
+        return self.observation()
+
+    def render(self):
+        # Block2D colours of the objects, one tile per cell
+        image = self.level.colors[self.grid]
+        return np.repeat(np.repeat(image, TILE_SIZE, axis=0), TILE_SIZE, axis=1)
+
+    def observation(self):
+        return self.get_observation()
+
+    def get_observation(self):
+        return ClustersObservation(self.grid.tobytes(), self.grid.shape, np.uint8)
+
+    def copy(self):
+        x = copy.copy(self)
+        x.grid = self.grid.copy()
+        x.state = x.grid
+        x.info = copy.deepcopy(self.info)
+        x.undo_stack = []
+        return x
+
+    def make_batch(self, batch_size):
+        return BatchNumpyClustersEnv(self, batch_size)
+
+    def get_state(self):
+        return {
+            "grid": self.grid.copy(),
+            "avatar": (self.avatar_x, self.avatar_y, self.avatar_alive),
+            "boxes": (self.box_broken, self.box_count),
+            "current_step": self.current_step,
+            "last_step": (self.action, self.reward, self.terminated, self.truncated, self.info),
+        }
+
+    def set_state(self, state):
+        self.grid = state["grid"].copy()
+        self.state = self.grid
+        self.avatar_x, self.avatar_y, self.avatar_alive = state["avatar"]
+        self.box_broken, self.box_count = state["boxes"]
+        self.current_step = state["current_step"]
+        self.action, self.reward, self.terminated, self.truncated, self.info = state["last_step"]
+        self.undo_stack = []
+
+
+class BatchNumpyClustersEnv:
+    """
+    Batch of NumpyClustersEnv states that are stepped at once, with the interface of BatchMinigridEnv.
+    """
+
+    def __init__(self, env, batch_size):
+
+        self.env_class = type(env)  # Forward model calls are counted on the environment class
+        self.config = env.config
+        self.is_stochastic = env.is_stochastic
+        self.action_space = env.action_space
+        self.batch_size = batch_size
+        self.level = env.level
+        self.max_steps = env.max_steps
+
+        self.grids = np.zeros((batch_size,) + env.grid.shape, dtype=np.uint8)
+        self.avatar_x = np.zeros(batch_size, dtype=np.int64)
+        self.avatar_y = np.zeros(batch_size, dtype=np.int64)
+        self.avatar_alive = np.zeros(batch_size, dtype=np.bool_)
+        self.box_broken = np.zeros(batch_size, dtype=np.bool_)
+        self.box_count = np.zeros(batch_size, dtype=np.int64)
+        self.current_step = np.zeros(batch_size, dtype=np.int64)
+        self.terminated = np.zeros(batch_size, dtype=np.bool_)
+        self.truncated = np.zeros(batch_size, dtype=np.bool_)
+
+    def load(self, index, env):
+        self.grids[index] = env.grid
+        self.avatar_x[index] = env.avatar_x
+        self.avatar_y[index] = env.avatar_y
+        self.avatar_alive[index] = env.avatar_alive
+        self.box_broken[index] = env.box_broken
+        self.box_count[index] = env.box_count
+        self.current_step[index] = env.current_step
+        self.terminated[index] = bool(env.terminated)
+        self.truncated[index] = bool(env.truncated)
+
+    def load_all(self, envs):
+        for index, env in enumerate(envs):
+            self.load(index, env)
+
+    def copy_row(self, index_from, index_to):
+        for array in [
+            self.grids,
+            self.avatar_x,
+            self.avatar_y,
+            self.avatar_alive,
+            self.box_broken,
+            self.box_count,
+            self.current_step,
+            self.terminated,
+            self.truncated,
+        ]:
+            array[index_to] = array[index_from]
+
+    def step(self, actions, active=None):
+
+        # actions has one action per row, rows that are not active are left unchanged
+        level = self.level
+        rows = np.arange(self.batch_size) if active is None else np.flatnonzero(active)
+        actions = np.asarray(actions)[rows]
+        rewards = np.zeros(self.batch_size, dtype=np.int64)
+        row_rewards = np.zeros(len(rows), dtype=np.int64)
+
+        dx = ACTION_TO_DX[actions]
+        dy = ACTION_TO_DY[actions]
+        avatar_x = self.avatar_x[rows]
+        avatar_y = self.avatar_y[rows]
+        moving = (actions != NO_ACTION) & self.avatar_alive[rows]
+        front_x = avatar_x + dx
+        front_y = avatar_y + dy
+        front = self.grids[rows, front_y, front_x]
+
+        # The avatar dies on a spike
+        die = moving & (front == level.spike)
+        self.grids[rows[die], avatar_y[die], avatar_x[die]] = EMPTY
+        self.avatar_alive[rows[die]] = False
+        row_rewards[die] -= 1
+
+        # Boxes are pushed in the same direction, rows that are not pushing read the cell behind their front one
+        # clipped to the grid, and don't use it
+        push = moving & (level.box_to_block[front] != EMPTY)
+        behind_x = np.clip(front_x + dx, 0, self.grids.shape[2] - 1)
+        behind_y = np.clip(front_y + dy, 0, self.grids.shape[1] - 1)
+        behind = self.grids[rows, behind_y, behind_x]
+        push_box = push & (behind == EMPTY)
+        self.grids[rows[push_box], behind_y[push_box], behind_x[push_box]] = front[push_box]
+        self.grids[rows[push_box], front_y[push_box], front_x[push_box]] = EMPTY
+
+        cluster = push & (behind == level.box_to_block[front])
+        self.grids[rows[cluster], front_y[cluster], front_x[cluster]] = behind[cluster]
+        self.box_count[rows[cluster]] -= 1
+        row_rewards[cluster] += 1
+
+        break_box = push & (behind == level.spike)
+        self.grids[rows[break_box], front_y[break_box], front_x[break_box]] = level.broken_box
+        self.box_broken[rows[break_box]] = True
+        row_rewards[break_box] -= 1
+
+        # The avatar moves into empty cells, and into the cells of the boxes it pushed
+        move = moving & ((front == EMPTY) | push_box)
+        self.grids[rows[move], avatar_y[move], avatar_x[move]] = EMPTY
+        self.grids[rows[move], front_y[move], front_x[move]] = level.avatar
+        self.avatar_x[rows[move]] = front_x[move]
+        self.avatar_y[rows[move]] = front_y[move]
+
+        self.current_step[rows] += 1
+        done = (self.box_count[rows] == 0) | self.box_broken[rows] | ~self.avatar_alive[rows]
+        done |= self.current_step[rows] > self.max_steps
+
+        # The Griddly player observes an empty grid once its avatar is removed
+        self.grids[rows[die]] = EMPTY
+
+        # Same as ClustersEnv.step, games that end without losing are truncated, and truncated games get no reward
+        self.terminated[rows] = done & (row_rewards == -1)
+        self.truncated[rows] = done & (row_rewards != -1)
+        rewards[rows] = np.where(self.truncated[rows], 0, row_rewards)
+
+        self.env_class.forward_model_calls += len(rows)
+        return rewards, self.terminated.copy(), self.truncated.copy()
+
+    def stochastic_step(self, actions, action_failure_probs, active=None):
+
+        if self.is_stochastic:  # If the env is stochastic, failed actions are swapped for no action
+            actions = np.where(action_failure_probs < self.config.action_failure_probability, NO_ACTION, actions)
+        return self.step(actions, active)
+
+    def get_observation(self, index):
+        grid = self.grids[index]
+        return ClustersObservation(grid.tobytes(), grid.shape, np.uint8)
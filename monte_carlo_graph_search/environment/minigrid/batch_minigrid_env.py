@@ -0,0 +1,253 @@
+import numpy as np
+from minigrid.core.world_object import WorldObj
+
+from monte_carlo_graph_search.environment.minigrid.minigrid_observation import (
+    CLOSED,
+    LOCKED,
+    OPEN,
+    TYPE_NAMES,
+    MinigridObservation,
+    hash_agent,
+)
+from monte_carlo_graph_search.environment.minigrid.minigrid_utils import (
+    COLOR_TO_IDX,
+    OBJECT_TO_IDX,
+)
+
+EMPTY = OBJECT_TO_IDX["empty"]
+DOOR = OBJECT_TO_IDX["door"]
+KEY = OBJECT_TO_IDX["key"]
+BALL = OBJECT_TO_IDX["ball"]
+BOX = OBJECT_TO_IDX["box"]
+GOAL = OBJECT_TO_IDX["goal"]
+LAVA = OBJECT_TO_IDX["lava"]
+FLOOR = OBJECT_TO_IDX["floor"]
+
+MUTABLE_TYPES = [DOOR, KEY, BALL, BOX]
+
+# MiniGrid actions
+LEFT, RIGHT, FORWARD, PICKUP, DROP, TOGGLE, DONE = range(7)
+
+# Direction -> (dx, dy) of the cell in front of the agent, same as minigrid DIR_TO_VEC
+DIR_TO_DX = np.array([1, 0, -1, 0])
+DIR_TO_DY = np.array([0, 1, 0, -1])
+
+
+class BatchMinigridEnv:
+    """
+    NumPy implementation of the CustomMinigridEnv DoorKey dynamics that steps a batch of states at once.
+    Every row is an independent copy of the environment, loaded from a CustomMinigridEnv, and the grid is kept
+    as per-cell arrays of object types, colours and door flags. Observations and rewards are the same as the ones
+    of CustomMinigridEnv.get_observation and CustomMinigridEnv.step.
+    Boxes are always empty (as in the levels), so toggling a box removes it.
+    """
+
+    def __init__(self, env, batch_size):
+
+        self.env_class = type(env)  # Forward model calls are counted on the environment class
+        self.config = env.config
+        self.is_stochastic = env.is_stochastic
+        self.action_space = env.action_space
+        self.batch_size = batch_size
+
+        self.width = env.width
+        self.height = env.height
+        self.max_steps = env.max_steps
+
+        # Doors never move, so the doors part of the observation always reads the same cells
+        self.door_cells = np.array(
+            [index for index, tile in enumerate(env.grid.grid) if tile is not None and tile.type == "door"],
+            dtype=np.int64,
+        )
+
+        number_of_cells = self.width * self.height
+        self.agent_x = np.zeros(batch_size, dtype=np.int64)
+        self.agent_y = np.zeros(batch_size, dtype=np.int64)
+        self.agent_dir = np.zeros(batch_size, dtype=np.int64)
+        self.carry_type = np.full(batch_size, EMPTY, dtype=np.int8)
+        self.carry_color = np.zeros(batch_size, dtype=np.int8)
+        self.cell_type = np.full((batch_size, number_of_cells), EMPTY, dtype=np.int8)
+        self.cell_color = np.zeros((batch_size, number_of_cells), dtype=np.int8)
+        self.door_open = np.zeros((batch_size, number_of_cells), dtype=np.bool_)
+        self.door_locked = np.zeros((batch_size, number_of_cells), dtype=np.bool_)
+        self.step_count = np.zeros(batch_size, dtype=np.int64)
+        self.terminated = np.zeros(batch_size, dtype=np.bool_)
+        self.truncated = np.zeros(batch_size, dtype=np.bool_)
+
+        self.layout = env.layout
+        self.objects = {}  # objects -> (objects, hash), the objects only change on pickup, drop and toggle
+
+    def load(self, index, env):
+
+        self.agent_x[index] = env.agent_pos[0]
+        self.agent_y[index] = env.agent_pos[1]
+        self.agent_dir[index] = env.agent_dir
+        self.carry_type[index], self.carry_color[index], _, _ = encode_object(env.carrying)
+        for cell, tile in enumerate(env.grid.grid):
+            (
+                self.cell_type[index, cell],
+                self.cell_color[index, cell],
+                self.door_open[index, cell],
+                self.door_locked[index, cell],
+            ) = encode_object(tile)
+        self.step_count[index] = env.step_count
+        self.terminated[index] = bool(env.terminated)
+        self.truncated[index] = bool(env.truncated)
+
+    def load_all(self, envs):
+        for index, env in enumerate(envs):
+            self.load(index, env)
+
+    def store(self, index, env):
+
+        # Inverse of load, writes a row back to a CustomMinigridEnv of the same level
+        env.agent_pos = (self.agent_x.item(index), self.agent_y.item(index))
+        env.agent_dir = self.agent_dir.item(index)
+        env.carrying = decode_object(self.carry_type.item(index), self.carry_color.item(index), False, False)
+        env.grid.grid = [
+            decode_object(*cell)
+            for cell in zip(
+                self.cell_type[index].tolist(),
+                self.cell_color[index].tolist(),
+                self.door_open[index].tolist(),
+                self.door_locked[index].tolist(),
+            )
+        ]
+        env.encode_grid()
+        env.step_count = self.step_count.item(index)
+        env.terminated = self.terminated.item(index)
+        env.truncated = self.truncated.item(index)
+
+    def copy_row(self, index_from, index_to):
+        for array in [
+            self.agent_x,
+            self.agent_y,
+            self.agent_dir,
+            self.carry_type,
+            self.carry_color,
+            self.cell_type,
+            self.cell_color,
+            self.door_open,
+            self.door_locked,
+            self.step_count,
+            self.terminated,
+            self.truncated,
+        ]:
+            array[index_to] = array[index_from]
+
+    def step(self, actions, active=None):
+
+        # actions has one action per row, rows that are not active are left unchanged
+        rows = np.arange(self.batch_size) if active is None else np.flatnonzero(active)
+        actions = np.asarray(actions)[rows]
+        rewards = np.zeros(self.batch_size, dtype=np.float64)
+        terminated = np.zeros(len(rows), dtype=np.bool_)
+
+        self.step_count[rows] += 1
+
+        agent_dir = self.agent_dir[rows]
+        front_x = self.agent_x[rows] + DIR_TO_DX[agent_dir]
+        front_y = self.agent_y[rows] + DIR_TO_DY[agent_dir]
+        front_cells = front_y * self.width + front_x
+        front_type = self.cell_type[rows, front_cells]
+        front_color = self.cell_color[rows, front_cells]
+        front_open = self.door_open[rows, front_cells]
+        front_locked = self.door_locked[rows, front_cells]
+        carry_type = self.carry_type[rows]
+
+        # Rotate left and right
+        self.agent_dir[rows] = np.where(actions == LEFT, (agent_dir - 1) % 4, agent_dir)
+        self.agent_dir[rows] = np.where(actions == RIGHT, (agent_dir + 1) % 4, self.agent_dir[rows])
+
+        # Move forward
+        can_overlap = np.isin(front_type, [EMPTY, FLOOR, GOAL, LAVA]) | ((front_type == DOOR) & front_open)
+        move = (actions == FORWARD) & can_overlap
+        self.agent_x[rows[move]] = front_x[move]
+        self.agent_y[rows[move]] = front_y[move]
+        reached_goal = (actions == FORWARD) & (front_type == GOAL)
+        terminated |= reached_goal | ((actions == FORWARD) & (front_type == LAVA))
+        rewards[rows[reached_goal]] = 1 - 0.9 * (self.step_count[rows[reached_goal]] / self.max_steps)
+
+        # Pick up an object
+        pickup = (actions == PICKUP) & np.isin(front_type, [KEY, BALL, BOX]) & (carry_type == EMPTY)
+        self.carry_type[rows[pickup]] = front_type[pickup]
+        self.carry_color[rows[pickup]] = front_color[pickup]
+        self.clear_cells(rows[pickup], front_cells[pickup])
+
+        # Drop an object
+        drop = (actions == DROP) & (front_type == EMPTY) & (carry_type != EMPTY)
+        self.cell_type[rows[drop], front_cells[drop]] = carry_type[drop]
+        self.cell_color[rows[drop], front_cells[drop]] = self.carry_color[rows[drop]]
+        self.carry_type[rows[drop]] = EMPTY
+        self.carry_color[rows[drop]] = 0
+
+        # Toggle a door, or open a box
+        toggle = actions == TOGGLE
+        unlock = toggle & (front_type == DOOR) & front_locked
+        unlock &= (carry_type == KEY) & (self.carry_color[rows] == front_color)
+        self.door_locked[rows[unlock], front_cells[unlock]] = False
+        self.door_open[rows[unlock], front_cells[unlock]] = True
+        flip = toggle & (front_type == DOOR) & ~front_locked
+        self.door_open[rows[flip], front_cells[flip]] = ~front_open[flip]
+        open_box = toggle & (front_type == BOX)
+        self.clear_cells(rows[open_box], front_cells[open_box])
+
+        self.terminated[rows] = terminated
+        self.truncated[rows] = self.step_count[rows] >= self.max_steps
+
+        self.env_class.forward_model_calls += len(rows)
+        return rewards, self.terminated.copy(), self.truncated.copy()
+
+    def stochastic_step(self, actions, action_failure_probs, active=None):
+
+        if self.is_stochastic:  # If the env is stochastic, failed actions are swapped for no action
+            actions = np.where(action_failure_probs < self.config.action_failure_probability, DONE, actions)
+        return self.step(actions, active)
+
+    def clear_cells(self, rows, cells):
+        self.cell_type[rows, cells] = EMPTY
+        self.cell_color[rows, cells] = 0
+        self.door_open[rows, cells] = False
+        self.door_locked[rows, cells] = False
+
+    def get_observation(self, index):
+
+        carry_type = self.carry_type.item(index)
+        agent = (
+            self.agent_x.item(index),
+            self.agent_y.item(index),
+            self.agent_dir.item(index),
+            None if carry_type == EMPTY else TYPE_NAMES[carry_type],
+        )
+
+        # Same (cell, code) of the mutable objects as minigrid_observation.encode_grid
+        cell_type = self.cell_type[index]
+        cells = np.flatnonzero(np.isin(cell_type, MUTABLE_TYPES))
+        door_state = np.where(
+            self.door_open[index, cells], OPEN, np.where(self.door_locked[index, cells], LOCKED, CLOSED)
+        )
+        codes = cell_type[cells] * 3 + np.where(cell_type[cells] == DOOR, door_state, 0)
+        objects = tuple(zip(cells.tolist(), codes.tolist()))
+        objects_and_hash = self.objects.get(objects)
+        if objects_and_hash is None:
+            objects_and_hash = (objects, self.layout.hash_objects(objects))
+            self.objects[objects] = objects_and_hash
+
+        objects, objects_hash = objects_and_hash
+        return MinigridObservation(agent, objects, objects_hash ^ hash_agent(*agent), self.layout)
+
+
+def encode_object(obj):
+    # (type, colour, is open, is locked) of a grid cell
+    if obj is None:
+        return EMPTY, 0, False, False
+    if obj.type == "door":
+        return DOOR, COLOR_TO_IDX[obj.color], obj.is_open, obj.is_locked
+    return OBJECT_TO_IDX[obj.type], COLOR_TO_IDX[obj.color], False, False
+
+
+def decode_object(object_type, color, is_open, is_locked):
+    if object_type == EMPTY:
+        return None
+    # Door state of WorldObj.decode, 0: open, 1: closed, 2: locked
+    return WorldObj.decode(object_type, color, 0 if is_open else (2 if is_locked else 1))
@@ -6,6 +6,17 @@ from minigrid.core.world_object import Ball, Box, Door, Floor, Goal, Key, Lava,
 from minigrid.envs import DoorKeyEnv
 
 from monte_carlo_graph_search.environment.minigrid import minigrid_levels
+from monte_carlo_graph_search.environment.minigrid.batch_minigrid_env import (
+    BatchMinigridEnv,
+)
+from monte_carlo_graph_search.environment.minigrid.minigrid_observation import (
+    EMPTY_CODE,
+    MUTABLE_OBJECTS,
+    MinigridObservation,
+    encode_cell,
+    encode_grid,
+    hash_agent,
+)
 from monte_carlo_graph_search.environment.minigrid.minigrid_utils import (
     TEXT_TO_OBJECT,
     EnvType,
@@ -41,16 +52,70 @@ class CustomMinigridEnv(DoorKeyEnv):
 
         self.info = None
 
+        self.undo_stack = []
+
+        # Static layer of the level, and the mutable objects of the grid with their Zobrist hash, which step updates
+        self.layout = None
+        self.objects = None
+        self.objects_hash = None
+
         self.reset()
 
     def step(self, action):
 
         self.action = action  # Save the original action
+        front_cell = int(self.front_pos[1] * self.width + self.front_pos[0])
         self.state, self.reward, self.terminated, self.truncated, self.info = super().step(action)  # Do the step
+        if action == self.actions.pickup or action == self.actions.drop or action == self.actions.toggle:
+            self.update_cell(front_cell)  # Only these actions change the grid, and only in front of the agent
         observation = self.observation()
         CustomMinigridEnv.forward_model_calls += 1
         return observation, self.reward, self.terminated, self.truncated, self.info
 
+    def step_with_undo(self, action):
+
+        # A step only changes the agent and the cell in front of it, which is all that undo() needs to revert it
+        front_cell = self.front_pos[1] * self.width + self.front_pos[0]
+        front_object = self.grid.grid[front_cell]
+        door_flags = None
+        if front_object is not None and front_object.type == "door":
+            door_flags = (front_object.is_open, front_object.is_locked)
+        self.undo_stack.append(
+            (
+                self.agent_pos,
+                self.agent_dir,
+                self.carrying,
+                self.step_count,
+                front_cell,
+                front_object,
+                door_flags,
+                self.objects,
+                self.objects_hash,
+                (self.action, self.state, self.reward, self.terminated, self.truncated, self.info),
+            )
+        )
+        return self.step(action)
+
+    def undo(self):
+
+        # Reverts the last step_with_undo
+        (
+            self.agent_pos,
+            self.agent_dir,
+            self.carrying,
+            self.step_count,
+            front_cell,
+            front_object,
+            door_flags,
+            self.objects,
+            self.objects_hash,
+            last_step,
+        ) = self.undo_stack.pop()
+        self.grid.grid[front_cell] = front_object
+        if door_flags is not None:
+            front_object.is_open, front_object.is_locked = door_flags
+        self.action, self.state, self.reward, self.terminated, self.truncated, self.info = last_step
+
     def stochastic_step(self, action, action_failure_prob=None):
         self.action = action  # Save the original action
 
@@ -122,9 +187,19 @@ class CustomMinigridEnv(DoorKeyEnv):
         self.info = None
 
         super().reset(seed=self.config.seed)
+        self.encode_grid()
 
         return self.observation()
 
+    def encode_grid(self):
+        self.layout, self.objects = encode_grid(self.grid.grid)
+        self.objects_hash = self.layout.hash_objects(self.objects)
+
+    def update_cell(self, cell):
+        tile = self.grid.grid[cell]
+        code = encode_cell(tile) if tile is not None and tile.type in MUTABLE_OBJECTS else EMPTY_CODE
+        self.objects, self.objects_hash = self.layout.update_objects(self.objects, self.objects_hash, cell, code)
+
     def render(self):
         return super().render()
 
@@ -138,19 +213,60 @@ class CustomMinigridEnv(DoorKeyEnv):
         return self.get_observation()
 
     def get_observation(self):
-        agent_pos_x = self.agent_pos[0]
-        agent_pos_y = self.agent_pos[1]
+        agent_pos_x = int(self.agent_pos[0])
+        agent_pos_y = int(self.agent_pos[1])
         agent_dir = self.agent_dir
         agent_carry = None if self.carrying is None else self.carrying.type
 
-        doors_open = [tile.is_open for tile in self.grid.grid if tile is not None and tile.type == "door"]
-        doors_locked = [tile.is_locked for tile in self.grid.grid if tile is not None and tile.type == "door"]
-        grid = [("empty" if tile is None else tile.type) for tile in self.grid.grid]
-
-        return tuple([agent_pos_x, agent_pos_y, agent_dir, agent_carry] + doors_open + doors_locked + grid)
+        agent = (agent_pos_x, agent_pos_y, agent_dir, agent_carry)
+        state_hash = self.objects_hash ^ hash_agent(agent_pos_x, agent_pos_y, agent_dir, agent_carry)
+        return MinigridObservation(agent, self.objects, state_hash, self.layout)
 
     def copy(self):
-        return copy.deepcopy(self)
+        # Static objects, the level and the render machinery are shared, only the dynamic state is copied
+        env = copy.copy(self)
+        env.set_state(self.get_state())
+        return env
+
+    def make_batch(self, batch_size):
+        return BatchMinigridEnv(self, batch_size)
+
+    def get_state(self):
+        # self.random is never drawn from while stepping, so it is shared instead of being part of the state
+        mutable_objects = [
+            (index, copy_object(tile))
+            for index, tile in enumerate(self.grid.grid)
+            if tile is not None and tile.type in MUTABLE_OBJECTS
+        ]
+        return {
+            "agent_pos": tuple(self.agent_pos),
+            "agent_dir": self.agent_dir,
+            "carrying": copy_object(self.carrying),
+            "grid": list(self.grid.grid),
+            "mutable_objects": mutable_objects,
+            "step_count": self.step_count,
+            "objects": self.objects,
+            "objects_hash": self.objects_hash,
+            "np_random": copy.copy(self.np_random),
+            "last_step": (self.action, self.state, self.reward, self.terminated, self.truncated, self.info),
+        }
+
+    def set_state(self, state):
+        # Mutable objects are copied again, so that the same state can be restored more than once
+        self.agent_pos = state["agent_pos"]
+        self.agent_dir = state["agent_dir"]
+        self.carrying = copy_object(state["carrying"])
+        self.grid = Grid(self.width, self.height)
+        self.grid.grid = list(state["grid"])
+        for index, obj in state["mutable_objects"]:
+            self.grid.grid[index] = copy_object(obj)
+        self.step_count = state["step_count"]
+        self.objects = state["objects"]
+        self.objects_hash = state["objects_hash"]
+        self.np_random = copy.copy(state["np_random"])
+
+        self.action, self.state, self.reward, self.terminated, self.truncated, self.info = state["last_step"]
+        self.undo_stack = []  # Undo records are only valid for the state they were taken from
 
     def get_local_surrounding(self, sight=1):
 
@@ -204,3 +320,13 @@ class CustomMinigridEnv(DoorKeyEnv):
                     surrounding[i][j] = 4
 
         return surrounding
+
+
+def copy_object(obj):
+    if obj is None or obj.type not in MUTABLE_OBJECTS:
+        return obj
+
+    obj = copy.copy(obj)
+    if obj.type == "box":
+        obj.contains = copy_object(obj.contains)
+    return obj
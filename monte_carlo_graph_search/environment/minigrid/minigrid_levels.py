@@ -1,6 +1,8 @@
 def load_level(level_name):
     if level_name == "default":
         return None
+    elif level_name == "corner16":
+        return corner16
     elif level_name == "test16":
         return test16
     elif level_name == "labyrinth16":
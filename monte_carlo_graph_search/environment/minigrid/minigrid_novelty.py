@@ -1,16 +1,38 @@
+import numpy as np
+
+from monte_carlo_graph_search.environment.minigrid.minigrid_utils import OBJECT_TO_IDX
+
+FEATURE_NAMES = ["x_pos", "y_pos", "rotation", "carry", "door_open", "door_locked"]
+FEATURE_INDEX = {name: index for index, name in enumerate(FEATURE_NAMES)}
+
+
+def encode_carry(carry):
+    return 0 if carry is None else OBJECT_TO_IDX[carry] + 1
+
+
+# Feature value -> column of the count table, positions and directions are already small integers
+FEATURE_ENCODERS = [int, int, int, encode_carry, int, int]
+
+
+def encode_features(observation):
+    # Agent x, y, direction and carried type, and the first door flags (same as the observation head)
+    x_pos, y_pos, rot, carry, door_open, door_locked = observation[:6]
+    return int(x_pos), int(y_pos), int(rot), encode_carry(carry), int(door_open), int(door_locked)
+
+
 class MinigridNovelty:
+    """
+    Pseudo-count novelty of the agent and first door features. The counts of every feature value are kept in a
+    table with one row per feature, indexed by the encoded feature value.
+    A feature value is novel if it was never seen, or if its count is below the threshold of the average count.
+    """
+
     def __init__(self, config):
         self.total_data_points = 0
         self.threshold = config.novelty_threshold
 
-        self.novelty_features = {
-            "x_pos": {},
-            "y_pos": {},
-            "rotation": {},
-            "carry": {},
-            "door_open": {},
-            "door_locked": {},
-        }
+        self.counts = np.zeros((len(FEATURE_NAMES), 16), dtype=np.int64)  # Grows with the largest feature value
+        self.number_of_values = np.zeros(len(FEATURE_NAMES), dtype=np.int64)  # Seen values of every feature
 
         # Discovered, Nodes, Moves, FMC
         self.subgoals = {
@@ -38,63 +60,43 @@ class MinigridNovelty:
         return self.pseudo_count_novelty_function(observation)
 
     def check_if_novel(self, feature_value, feature_name):
+        index = FEATURE_INDEX[feature_name]
+        return self.check_feature(index, FEATURE_ENCODERS[index](feature_value))
+
+    def check_feature(self, index, value):
 
-        if feature_value not in self.novelty_features[feature_name]:
+        feature_value_count = self.counts.item(index, value) if value < self.counts.shape[1] else 0
+        if feature_value_count == 0:
             return 1
-        else:
-            feature_value_count = self.novelty_features[feature_name][feature_value]
-            num_feature_keys = len(self.novelty_features[feature_name].keys())
-            feature_value_threshold = feature_value_count * num_feature_keys / self.total_data_points
-            return int(feature_value_threshold < self.threshold)
+        feature_value_threshold = feature_value_count * self.number_of_values.item(index) / self.total_data_points
+        return int(feature_value_threshold < self.threshold)
 
     def pseudo_count_novelty_function(self, observation):
 
+        # Same as the sum of check_feature over the features, inlined as it runs for every new node
+        counts = self.counts
+        size = counts.shape[1]
         novelty_value = 0
-        x_pos, y_pos, rot, carry, door_open, door_locked = observation[:6]
-
-        novelty_value += self.check_if_novel(x_pos, "x_pos")
-        novelty_value += self.check_if_novel(y_pos, "y_pos")
-        novelty_value += self.check_if_novel(rot, "rotation")
-        novelty_value += self.check_if_novel(carry, "carry")
-        novelty_value += self.check_if_novel(door_open, "door_open")
-        novelty_value += self.check_if_novel(door_locked, "door_locked")
+        for index, value in enumerate(encode_features(observation)):
+            feature_value_count = counts.item(index, value) if value < size else 0
+            if feature_value_count == 0:
+                novelty_value += 1
+            elif feature_value_count * self.number_of_values.item(index) / self.total_data_points < self.threshold:
+                novelty_value += 1
 
         return novelty_value
 
     def update_posterior(self, observation, terminated, nodes, move, forward_model_calls):
 
-        x_pos, y_pos, rot, carry, opened, locked = observation[:6]
-
-        if x_pos in self.novelty_features["x_pos"]:
-            self.novelty_features["x_pos"][x_pos] += 1
-        else:
-            self.novelty_features["x_pos"][x_pos] = 1
-
-        if y_pos in self.novelty_features["y_pos"]:
-            self.novelty_features["y_pos"][y_pos] += 1
-        else:
-            self.novelty_features["y_pos"][y_pos] = 1
-
-        if rot in self.novelty_features["rotation"]:
-            self.novelty_features["rotation"][rot] += 1
-        else:
-            self.novelty_features["rotation"][rot] = 1
-
-        if carry in self.novelty_features["carry"]:
-            self.novelty_features["carry"][carry] += 1
-        else:
-            self.novelty_features["carry"][carry] = 1
-
-        if opened in self.novelty_features["door_open"]:
-            self.novelty_features["door_open"][opened] += 1
-        else:
-            self.novelty_features["door_open"][opened] = 1
-
-        if locked in self.novelty_features["door_locked"]:
-            self.novelty_features["door_locked"][locked] += 1
-        else:
-            self.novelty_features["door_locked"][locked] = 1
+        head = observation[:6]
+        features = encode_features(head)
+        self.reserve(max(features))
+        for index, value in enumerate(features):
+            if self.counts.item(index, value) == 0:
+                self.number_of_values[index] += 1
+            self.counts[index, value] += 1
 
+        _, _, _, carry, opened, _ = head
         if carry == "key":
             self.discover_subgoal("key", nodes, move, forward_model_calls)
         if opened is True:
@@ -104,6 +106,14 @@ class MinigridNovelty:
 
         self.total_data_points += 1
 
+    def reserve(self, value):
+        # Grows the count table so that it has a column for value
+        size = self.counts.shape[1]
+        if value >= size:
+            while value >= size:
+                size *= 2
+            self.counts = np.pad(self.counts, ((0, 0), (0, size - self.counts.shape[1])))
+
     def get_discovered_subgoals(self):
 
         subgoals = {
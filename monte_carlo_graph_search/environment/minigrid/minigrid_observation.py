@@ -0,0 +1,164 @@
+import numpy as np
+
+from monte_carlo_graph_search.environment.minigrid.minigrid_utils import (
+    IDX_TO_OBJECT,
+    OBJECT_TO_IDX,
+)
+
+DOOR = OBJECT_TO_IDX["door"]
+EMPTY = OBJECT_TO_IDX["empty"]
+
+# Objects that can be picked up, dropped or toggled, everything else in the grid never changes during an episode
+MUTABLE_OBJECTS = ("door", "key", "ball", "box")
+
+# Door states of a cell code, same as the minigrid encoding
+OPEN, CLOSED, LOCKED = range(3)
+NUMBER_OF_CODES = 64
+EMPTY_CODE = EMPTY * 3
+
+TYPE_NAMES = [IDX_TO_OBJECT.get(idx) for idx in range(max(IDX_TO_OBJECT) + 1)]
+CODE_NAMES = [TYPE_NAMES[code // 3] if code // 3 < len(TYPE_NAMES) else None for code in range(NUMBER_OF_CODES)]
+
+# Random 64-bit values of the agent x, y, direction and carried type, and of every (cell, code) of a grid.
+# They are drawn with fixed seeds, so that all environments and processes hash the same state to the same value
+AGENT_ZOBRIST = np.random.RandomState(0).randint(0, 2**64 - 1, size=(4, 256), dtype=np.uint64).tolist()
+cell_zobrist_tables = {}  # number of cells -> table
+
+layouts = {}  # static cell codes -> layout, so that every level has one layout per process
+
+
+def get_cell_zobrist(number_of_cells):
+    table = cell_zobrist_tables.get(number_of_cells)
+    if table is None:
+        random = np.random.RandomState(1)
+        table = random.randint(0, 2**64 - 1, size=(number_of_cells, NUMBER_OF_CODES), dtype=np.uint64).tolist()
+        cell_zobrist_tables[number_of_cells] = table
+    return table
+
+
+def get_layout(static_codes):
+    layout = layouts.get(static_codes)
+    if layout is None:
+        layout = MinigridLayout(static_codes)
+        layouts[static_codes] = layout
+    return layout
+
+
+def encode_cell(obj):
+    # One byte per cell, the object type and the door state
+    if obj is None:
+        return EMPTY_CODE
+    if obj.type == "door":
+        return DOOR * 3 + (OPEN if obj.is_open else (LOCKED if obj.is_locked else CLOSED))
+    return OBJECT_TO_IDX[obj.type] * 3
+
+
+def encode_grid(grid):
+    # Static cell codes of the grid, and the (cell, code) of the mutable objects in it
+    static_codes = bytes(
+        EMPTY_CODE if tile is not None and tile.type in MUTABLE_OBJECTS else encode_cell(tile) for tile in grid
+    )
+    objects = tuple(
+        (cell, encode_cell(tile)) for cell, tile in enumerate(grid) if tile is not None and tile.type in MUTABLE_OBJECTS
+    )
+    return get_layout(static_codes), objects
+
+
+def hash_agent(agent_x, agent_y, agent_dir, carry_type):
+    carry_code = OBJECT_TO_IDX[carry_type] if carry_type is not None else 0
+    agent_hash = AGENT_ZOBRIST[0][agent_x] ^ AGENT_ZOBRIST[1][agent_y]
+    return agent_hash ^ AGENT_ZOBRIST[2][agent_dir] ^ AGENT_ZOBRIST[3][carry_code]
+
+
+class MinigridLayout:
+    """
+    Static layer of a level, the cells that never change during an episode (walls, floor, goal and lava),
+    with empty cells where the mutable objects (doors, keys, balls and boxes) are. It is shared by all the
+    observations of the level.
+    """
+
+    def __init__(self, static_codes):
+        self.static_codes = static_codes
+        self.cell_zobrist = get_cell_zobrist(len(static_codes))
+
+    def __reduce__(self):
+        return get_layout, (self.static_codes,)
+
+    def hash_objects(self, objects):
+        objects_hash = 0
+        for cell, code in objects:
+            objects_hash ^= self.cell_zobrist[cell][code]
+        return objects_hash
+
+    def update_objects(self, objects, objects_hash, cell, code):
+
+        # Replaces the object of a cell, and returns the new objects and their hash
+        updated_objects = dict(objects)
+        previous_code = updated_objects.pop(cell, EMPTY_CODE)
+        if code == previous_code:
+            return objects, objects_hash
+        if previous_code != EMPTY_CODE:
+            objects_hash ^= self.cell_zobrist[cell][previous_code]
+        if code != EMPTY_CODE:
+            objects_hash ^= self.cell_zobrist[cell][code]
+            updated_objects[cell] = code
+        return tuple(sorted(updated_objects.items())), objects_hash
+
+
+class MinigridObservation:
+    """
+    Compact observation of a minigrid state, used as the identity of the state in the graph.
+    It only holds the dynamic part of the state, the agent (x, y, direction, carried type) and the (cell, code)
+    of every mutable object, and refers to the static layer of its level. The hash is the Zobrist hash of the
+    dynamic part, which the environments keep up to date step by step.
+    The observation tuple of CustomMinigridEnv (agent, doors open, doors locked, grid type names) is built when
+    it is indexed, e.g. for novelty, and is not kept.
+    """
+
+    __slots__ = ("agent", "objects", "hash", "layout")
+
+    def __init__(self, agent, objects, state_hash, layout):
+        self.agent = agent
+        self.objects = objects
+        self.hash = state_hash
+        self.layout = layout
+
+    def __hash__(self):
+        return self.hash
+
+    def __eq__(self, other):
+        if not isinstance(other, MinigridObservation):
+            return NotImplemented
+        return self.hash == other.hash and self.agent == other.agent and self.objects == other.objects
+
+    def __reduce__(self):
+        return MinigridObservation, (self.agent, self.objects, self.hash, self.layout)
+
+    def __getitem__(self, index):
+
+        # The agent and the doors are enough for most lookups (novelty only reads the first door)
+        head = self.get_head()
+        if isinstance(index, int) and 0 <= index < len(head):
+            return head[index]
+        if isinstance(index, slice) and index.stop is not None and 0 <= index.stop <= len(head):
+            if (index.start is None or index.start >= 0) and (index.step is None or index.step > 0):
+                return head[index]
+        return self.to_tuple()[index]
+
+    def __len__(self):
+        return len(self.get_head()) + len(self.layout.static_codes)
+
+    def __repr__(self):
+        return repr(self.to_tuple())
+
+    def get_head(self):
+        door_codes = [code for _, code in self.objects if code // 3 == DOOR]
+        doors_open = [code == DOOR * 3 + OPEN for code in door_codes]
+        doors_locked = [code == DOOR * 3 + LOCKED for code in door_codes]
+        return tuple(list(self.agent) + doors_open + doors_locked)
+
+    def to_tuple(self):
+        codes = list(self.layout.static_codes)
+        for cell, code in self.objects:
+            codes[cell] = code
+        return self.get_head() + tuple(CODE_NAMES[code] for code in codes)
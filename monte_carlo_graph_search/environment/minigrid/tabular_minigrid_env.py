@@ -0,0 +1,350 @@
+import copy
+
+import numpy as np
+
+from monte_carlo_graph_search.environment.minigrid.batch_minigrid_env import (
+    BALL,
+    BOX,
+    DONE,
+    EMPTY,
+    KEY,
+    BatchMinigridEnv,
+)
+from monte_carlo_graph_search.environment.minigrid.custom_minigrid_env import (
+    CustomMinigridEnv,
+)
+
+NUMBER_OF_ACTIONS = 7
+AGENT_FIELDS = 5  # x, y, direction, carried type, carried colour
+
+
+class TransitionTable:
+    """
+    Every state of a level that is reachable from its initial state, with the next state of each one for each action.
+    States are numbered in the order they were found, the initial state is 0. A state is stored as a row of bytes with
+    the agent, the objects in the cells that can change (empty cells, keys, balls and boxes) and the door flags.
+    The step counter is not part of a state, so the table stores whether a transition reached the goal instead of
+    its reward, and the environment computes the reward and the truncation from its own step counter.
+    """
+
+    def __init__(self, level, states, next_states, terminated, reached_goal, dynamic_cells, door_cells):
+        self.level = level  # (level name, size, seed), the table is only valid for the same level
+        self.states = states
+        self.next_states = next_states
+        self.terminated = terminated
+        self.reached_goal = reached_goal
+        self.dynamic_cells = dynamic_cells
+        self.door_cells = door_cells
+
+    def __len__(self):
+        return len(self.states)
+
+    def save(self, path):
+        np.savez_compressed(
+            path,
+            level=np.array(self.level),
+            states=self.states,
+            next_states=self.next_states,
+            terminated=self.terminated,
+            reached_goal=self.reached_goal,
+            dynamic_cells=self.dynamic_cells,
+            door_cells=self.door_cells,
+        )
+
+
+def load_transition_table(path):
+    with np.load(path) as data:
+        return TransitionTable(
+            level=tuple(data["level"].tolist()),
+            states=data["states"],
+            next_states=data["next_states"],
+            terminated=data["terminated"],
+            reached_goal=data["reached_goal"],
+            dynamic_cells=data["dynamic_cells"],
+            door_cells=data["door_cells"],
+        )
+
+
+def get_level(env_config):
+    return (str(env_config.level_name), str(env_config.size), str(env_config.seed))
+
+
+def pack_states(batch_env, rows, dynamic_cells):
+    return np.concatenate(
+        [
+            np.stack(
+                [
+                    batch_env.agent_x[rows],
+                    batch_env.agent_y[rows],
+                    batch_env.agent_dir[rows],
+                    batch_env.carry_type[rows],
+                    batch_env.carry_color[rows],
+                ],
+                axis=1,
+            ),
+            batch_env.cell_type[rows][:, dynamic_cells],
+            batch_env.cell_color[rows][:, dynamic_cells],
+            batch_env.door_open[rows][:, batch_env.door_cells],
+            batch_env.door_locked[rows][:, batch_env.door_cells],
+        ],
+        axis=1,
+    ).astype(np.uint8)
+
+
+def unpack_states(batch_env, rows, states, dynamic_cells):
+
+    # Cells that are not dynamic are left as they are, so the rows need to be loaded from the level first
+    number_of_cells = len(dynamic_cells)
+    number_of_doors = len(batch_env.door_cells)
+    states = states.astype(np.int64)
+    batch_env.agent_x[rows] = states[:, 0]
+    batch_env.agent_y[rows] = states[:, 1]
+    batch_env.agent_dir[rows] = states[:, 2]
+    batch_env.carry_type[rows] = states[:, 3]
+    batch_env.carry_color[rows] = states[:, 4]
+
+    offset = AGENT_FIELDS
+    rows = np.asarray(rows)[:, None]
+    batch_env.cell_type[rows, dynamic_cells] = states[:, offset : offset + number_of_cells]
+    offset += number_of_cells
+    batch_env.cell_color[rows, dynamic_cells] = states[:, offset : offset + number_of_cells]
+    offset += number_of_cells
+    batch_env.door_open[rows, batch_env.door_cells] = states[:, offset : offset + number_of_doors]
+    offset += number_of_doors
+    batch_env.door_locked[rows, batch_env.door_cells] = states[:, offset : offset + number_of_doors]
+
+
+def build_transition_table(env, states_per_step=4096):
+
+    # Breadth first search from the initial state of the env, stepping every action of many states at once
+    batch_env = BatchMinigridEnv(env, states_per_step * NUMBER_OF_ACTIONS)
+    batch_env.load(0, env)
+    for row in range(1, batch_env.batch_size):
+        batch_env.copy_row(0, row)
+    dynamic_cells = np.flatnonzero(np.isin(batch_env.cell_type[0], [EMPTY, KEY, BALL, BOX]))
+
+    initial_state = pack_states(batch_env, [0], dynamic_cells)[0]
+    states = [initial_state]
+    state_ids = {initial_state.tobytes(): 0}
+    next_states = []
+    terminated = []
+    reached_goal = []
+
+    start = 0
+    while start < len(states):
+        block = np.array(states[start : start + states_per_step])
+        rows = np.arange(len(block) * NUMBER_OF_ACTIONS)
+        unpack_states(batch_env, rows, np.repeat(block, NUMBER_OF_ACTIONS, axis=0), dynamic_cells)
+        batch_env.step_count[:] = 0
+
+        active = np.zeros(batch_env.batch_size, dtype=np.bool_)
+        active[rows] = True
+        actions = np.tile(np.arange(NUMBER_OF_ACTIONS), states_per_step)
+        rewards, block_terminated, _ = batch_env.step(actions, active)
+
+        block_next_states = []
+        for state in pack_states(batch_env, rows, dynamic_cells):
+            key = state.tobytes()
+            state_id = state_ids.get(key)
+            if state_id is None:
+                state_id = len(states)
+                state_ids[key] = state_id
+                states.append(state)
+            block_next_states.append(state_id)
+
+        next_states.append(np.array(block_next_states, dtype=np.int32).reshape(-1, NUMBER_OF_ACTIONS))
+        terminated.append(block_terminated[rows].reshape(-1, NUMBER_OF_ACTIONS))
+        reached_goal.append((rewards[rows] > 0).reshape(-1, NUMBER_OF_ACTIONS))
+        start += len(block)
+
+    return TransitionTable(
+        level=get_level(env.config),
+        states=np.array(states),
+        next_states=np.concatenate(next_states),
+        terminated=np.concatenate(terminated),
+        reached_goal=np.concatenate(reached_goal),
+        dynamic_cells=dynamic_cells,
+        door_cells=batch_env.door_cells,
+    )
+
+
+class TabularMinigridEnv:
+    """
+    CustomMinigridEnv of a fixed level that steps through a precomputed transition table,
+    so a step is an array lookup and a copy only copies a state id and a step counter.
+    Observations are decoded from the table the first time they are needed, and are the same as the ones of
+    CustomMinigridEnv.get_observation.
+    """
+
+    forward_model_calls = 0
+
+    def __init__(self, env_config, table=None):
+
+        self.config = env_config
+        self.table = load_transition_table(self.config.transition_table) if table is None else table
+        if self.table.level != get_level(self.config):
+            raise ValueError(f"Transition table of level {self.table.level} can't be used for {get_level(self.config)}")
+
+        # The level is only used to decode observations and render, and is shared by all the copies
+        self.level_env = CustomMinigridEnv(env_config)
+        self.decoder = BatchMinigridEnv(self.level_env, 1)
+        self.decoder.load(0, self.level_env)
+        self.observations = {}
+
+        self.is_stochastic = self.level_env.is_stochastic
+        self.action_space = self.level_env.action_space
+        self.max_steps = self.level_env.max_steps
+        self.name = "TabularDoorkey"
+
+        self.state_id = 0
+        self.step_count = 0
+
+        self.action = None
+        self.reward = None
+        self.terminated = None
+        self.truncated = None
+        self.info = None
+
+        self.undo_stack = []
+
+    def step(self, action):
+
+        self.action = action
+        state_id = self.state_id
+        self.state_id = self.table.next_states.item(state_id, action)
+        self.step_count += 1
+
+        self.reward = 0
+        if self.table.reached_goal.item(state_id, action):
+            self.reward = 1 - 0.9 * (self.step_count / self.max_steps)
+        self.terminated = self.table.terminated.item(state_id, action)
+        self.truncated = self.step_count >= self.max_steps
+        self.info = {}
+
+        TabularMinigridEnv.forward_model_calls += 1
+        return self.get_observation(), self.reward, self.terminated, self.truncated, self.info
+
+    def step_with_undo(self, action):
+        self.undo_stack.append(
+            (self.state_id, self.step_count, (self.action, self.reward, self.terminated, self.truncated, self.info))
+        )
+        return self.step(action)
+
+    def undo(self):
+        # Reverts the last step_with_undo
+        self.state_id, self.step_count, last_step = self.undo_stack.pop()
+        self.action, self.reward, self.terminated, self.truncated, self.info = last_step
+
+    def stochastic_step(self, action, action_failure_prob=None):
+        self.action = action  # Save the original action
+
+        if self.is_stochastic:  # If the env is stochastic check if action should fail
+            if action_failure_prob < self.config.action_failure_probability:  # If the action should fail, swap it here
+                action = DONE  # No action
+
+        return self.step(action)
+
+    def reset(self):
+        self.state_id = 0
+        self.step_count = 0
+        self.action, self.reward, self.terminated, self.truncated, self.info = None, None, None, None, None
+        return self.get_observation()
+
+    def get_observation(self):
+        return self.get_state_observation(self.state_id)
+
+    def get_state_observation(self, state_id):
+        observation = self.observations.get(state_id)
+        if observation is None:
+            unpack_states(self.decoder, [0], self.table.states[[state_id]], self.table.dynamic_cells)
+            observation = self.decoder.get_observation(0)
+            self.observations[state_id] = observation
+        return observation
+
+    def copy(self):
+        # The table, the level and the decoded observations are shared
+        env = copy.copy(self)
+        env.undo_stack = []
+        return env
+
+    def make_batch(self, batch_size):
+        return BatchTabularMinigridEnv(self, batch_size)
+
+    def get_state(self):
+        return {
+            "state_id": self.state_id,
+            "step_count": self.step_count,
+            "last_step": (self.action, self.reward, self.terminated, self.truncated, self.info),
+        }
+
+    def set_state(self, state):
+        self.state_id = state["state_id"]
+        self.step_count = state["step_count"]
+        self.action, self.reward, self.terminated, self.truncated, self.info = state["last_step"]
+        self.undo_stack = []
+
+    def render(self):
+        unpack_states(self.decoder, [0], self.table.states[[self.state_id]], self.table.dynamic_cells)
+        self.decoder.store(0, self.level_env)
+        return self.level_env.render()
+
+
+class BatchTabularMinigridEnv:
+    """
+    Batch of TabularMinigridEnv states, with the same interface as BatchMinigridEnv.
+    """
+
+    def __init__(self, env, batch_size):
+
+        self.env = env  # Observations are decoded and cached by the environment
+        self.config = env.config
+        self.is_stochastic = env.is_stochastic
+        self.action_space = env.action_space
+        self.batch_size = batch_size
+        self.max_steps = env.max_steps
+        self.table = env.table
+
+        self.state_id = np.zeros(batch_size, dtype=np.int64)
+        self.step_count = np.zeros(batch_size, dtype=np.int64)
+        self.terminated = np.zeros(batch_size, dtype=np.bool_)
+        self.truncated = np.zeros(batch_size, dtype=np.bool_)
+
+    def load(self, index, env):
+        self.state_id[index] = env.state_id
+        self.step_count[index] = env.step_count
+        self.terminated[index] = bool(env.terminated)
+        self.truncated[index] = bool(env.truncated)
+
+    def load_all(self, envs):
+        for index, env in enumerate(envs):
+            self.load(index, env)
+
+    def copy_row(self, index_from, index_to):
+        for array in [self.state_id, self.step_count, self.terminated, self.truncated]:
+            array[index_to] = array[index_from]
+
+    def step(self, actions, active=None):
+
+        rows = np.arange(self.batch_size) if active is None else np.flatnonzero(active)
+        actions = np.asarray(actions)[rows]
+        state_ids = self.state_id[rows]
+        rewards = np.zeros(self.batch_size, dtype=np.float64)
+
+        self.step_count[rows] += 1
+        self.state_id[rows] = self.table.next_states[state_ids, actions]
+        reached_goal = self.table.reached_goal[state_ids, actions]
+        rewards[rows[reached_goal]] = 1 - 0.9 * (self.step_count[rows[reached_goal]] / self.max_steps)
+        self.terminated[rows] = self.table.terminated[state_ids, actions]
+        self.truncated[rows] = self.step_count[rows] >= self.max_steps
+
+        TabularMinigridEnv.forward_model_calls += len(rows)
+        return rewards, self.terminated.copy(), self.truncated.copy()
+
+    def stochastic_step(self, actions, action_failure_probs, active=None):
+
+        if self.is_stochastic:  # If the env is stochastic, failed actions are swapped for no action
+            actions = np.where(action_failure_probs < self.config.action_failure_probability, DONE, actions)
+        return self.step(actions, active)
+
+    def get_observation(self, index):
+        return self.env.get_state_observation(self.state_id.item(index))
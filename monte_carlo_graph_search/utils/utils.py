@@ -17,6 +17,13 @@ def dict_sum(dictionary):
     return mean_dict
 
 
+def dict_mean(dictionary):
+    mean_dict = {}
+    for key, value in dictionary.items():
+        mean_dict[key] = np.mean(value)
+    return mean_dict
+
+
 def add_time_percentages(dictionary, total_time_value):
     metrics = {}
     for key, value in dictionary.items():